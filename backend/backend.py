@@ -1,29 +1,49 @@
 # Standard library imports
 import os
+import atexit
 import json
 import re
 import uuid
 import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
 import traceback
 import datetime
+import shutil
+import tempfile
 from io import BytesIO
-from functools import wraps
-from copy import deepcopy
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import ChainMap, OrderedDict, deque
+from functools import wraps, lru_cache
+from types import MappingProxyType
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 # Third-party imports
 from flask import Flask, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from google.cloud import storage
-from google.oauth2 import service_account
 from werkzeug.utils import secure_filename
 import requests
-
-# Initialize logging before optional imports that may use logger
-logging.basicConfig(level=logging.INFO)
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_UTC = datetime.timezone.utc
+
+# Initialize logging before optional imports that may use logger.
+# Records are queued and written by a listener thread, so request threads never block on
+# the stream; the queue handler only renders the message, the stream handler adds the prefix.
+_log_queue = queue.SimpleQueue()
+_log_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_log_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[_log_queue_handler])
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.handlers[0].setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -41,6 +61,27 @@ except ImportError:
         "Bidirectional text support not available. Install arabic-reshaper and python-bidi for Hebrew support."
     )
 
+# Optional fast JSON encoder/decoder for request and response bodies
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logger.warning("orjson not available; falling back to Flask's stdlib JSON handling.")
+
+# Optional Aho-Corasick automaton for custom translation term matching
+try:
+    import ahocorasick
+
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+    logger.warning("pyahocorasick not available; using regex matching for custom terms.")
+
+# Allergy / limitation rules and the shared keyword matcher (no Flask or Supabase imports)
+from dietary_rules import SubstringMatcher, dietary_rules
+
 # Optional import for Supabase API blueprint
 try:
     from supabase_api import supabase_bp
@@ -50,7 +91,37 @@ except ImportError as e:
     logger.warning(f"supabase_api module not available: {e}")
     SUPABASE_API_AVAILABLE = False
 
+
+class _OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson, so every jsonify() response and
+    request.get_json() body skips the stdlib encoder/decoder. Keeps Flask's key
+    sorting, pretty-printing in debug and fallback serializer (HTTP dates, Decimal,
+    __html__); non-ASCII text is emitted as UTF-8 rather than \\u escapes.
+    """
+
+    def dumps(self, obj, **kwargs):
+        indent = kwargs.pop("indent", None)
+        kwargs.pop("separators", None)
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+if ORJSON_AVAILABLE:
+    app.json = _OrjsonProvider(app)
 
 default_allowed_origins = [
     "http://localhost:5173",
@@ -111,23 +182,60 @@ second_supabase: Client = None
 if second_supabase_url and second_supabase_key:
     second_supabase = create_client(second_supabase_url, second_supabase_key)
 
+# Recent email -> auth user_id lookups on the second instance, so retried deletes skip the GET
+SECOND_AUTH_USER_ID_CACHE_SIZE = 1024
+_second_auth_user_ids = OrderedDict()
+_second_auth_user_ids_lock = threading.Lock()
+
 # Google Cloud Storage Configuration
 GCS_BUCKET_NAME = os.getenv("GCS_CHAT_BUCKET", "users-chat-uploads")
 GCS_SERVICE_ACCOUNT_FILE = os.getenv("GCS_SERVICE_ACCOUNT_FILE")
 GCS_SERVICE_ACCOUNT_JSON = os.getenv("GCS_SERVICE_ACCOUNT_JSON")
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+GCS_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Must be a multiple of 256 KB
+GCS_PARALLEL_UPLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+GCS_PARALLEL_UPLOAD_THRESHOLD = GCS_PARALLEL_UPLOAD_CHUNK_SIZE  # Smaller files are one part
+GCS_PARALLEL_UPLOAD_MAX_WORKERS = 8
 _gcs_client = None
+_gcs_client_lock = threading.Lock()
+_gcs_bucket_cache = {}
 
 # Azure Translator Configuration
 AZURE_TRANSLATOR_ENDPOINT = os.getenv("AZURE_TRANSLATOR_ENDPOINT")
 AZURE_TRANSLATOR_KEY = os.getenv("AZURE_TRANSLATOR_KEY")
 AZURE_TRANSLATOR_REGION = os.getenv("AZURE_TRANSLATOR_REGION")
+AZURE_TRANSLATOR_CONFIGURED = all(
+    [AZURE_TRANSLATOR_ENDPOINT, AZURE_TRANSLATOR_KEY, AZURE_TRANSLATOR_REGION]
+)
+if not AZURE_TRANSLATOR_CONFIGURED:
+    logger.warning("Azure Translator environment variables not configured")
+_AZURE_TRANSLATE_URL = f"{AZURE_TRANSLATOR_ENDPOINT}/translate?api-version=3.0"
+_AZURE_TRANSLATOR_HEADERS = MappingProxyType(
+    {
+        "Ocp-Apim-Subscription-Key": AZURE_TRANSLATOR_KEY,
+        "Ocp-Apim-Subscription-Region": AZURE_TRANSLATOR_REGION,
+        "Content-Type": "application/json",
+    }
+)
+AZURE_TRANSLATOR_CHUNK_SIZE = 50  # Azure caps a request at 100 items / 10k chars
+AZURE_TRANSLATOR_BATCH_WINDOW = 0.01  # Seconds single-text requests wait to be coalesced
+AZURE_TRANSLATOR_BATCH_TIMEOUT = 30
+AZURE_TRANSLATOR_TIMEOUT = (3, 30)  # (connect, read) seconds
+# Process-wide cap on in-flight translator requests, to stay under the Azure rate limit
+AZURE_TRANSLATOR_MAX_CONCURRENCY = int(os.getenv("AZURE_TRANSLATOR_MAX_CONCURRENCY", "8"))
+_translator_slots = threading.BoundedSemaphore(AZURE_TRANSLATOR_MAX_CONCURRENCY)
+TRANSLATION_CACHE_SIZE = 50000
+_translation_cache = OrderedDict()  # (text, target) -> Azure translation item, LRU order
+_translation_cache_lock = threading.Lock()
 
 # Azure OpenAI Configuration
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
 AZURE_OPENAI_API_BASE = os.getenv("AZURE_OPENAI_API_BASE")
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "obi2")
+# Global-Batch deployment used for bulk template generation through the Batch API. No default:
+# Azure rejects batch jobs on a standard deployment, so bulk requests fail until this is set.
+AZURE_OPENAI_BATCH_DEPLOYMENT = os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT")
 
 # Azure AD Configuration (for UPC service)
 AZURE_TENANT_ID = os.getenv("AZURE_TENANT_ID")
@@ -147,6 +255,53 @@ SUPABASE_EMAIL_REDIRECT_URL = os.getenv("SUPABASE_EMAIL_REDIRECT_URL")
 # DSPy Configuration
 USE_DSPY = os.getenv("USE_DSPY", "true").lower() == "true"
 
+# Shared HTTP session so outbound calls (translator, UPC lookups, Azure AD tokens) reuse
+# pooled TCP/TLS connections. These POSTs are idempotent, so they are retried with
+# backoff on throttling and 5xx like GETs. Read timeouts are not retried: a stalled
+# lookup would otherwise hold its _IO_POOL worker for several full timeouts.
+_http_session = requests.Session()
+_http_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=3,
+            read=0,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST"],
+        ),
+    ),
+)
+
+# Supabase admin (GoTrue) session: keep-alive plus bounded retries on gateway errors
+_supabase_http = requests.Session()
+_supabase_http.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=32,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+    ),
+)
+
+# Shared pool for blocking I/O fan-out (translator chunks, parallel Supabase writes).
+# Tasks run here must not submit to and wait on the pool themselves.
+_IO_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="bc-io")
+atexit.register(_IO_POOL.shutdown, wait=False)
+
+# Shared pool for LLM work fanned out per meal: the option builds in /api/build-menu (each
+# task is a chain of calls) and the fallback alternative names in _finish_template. Kept
+# apart from _IO_POOL so long builds cannot starve the short I/O tasks.
+_MEAL_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="meal-build")
+atexit.register(_MEAL_EXECUTOR.shutdown, wait=False)
+
+
+def _gather(fns):
+    """Run zero-argument callables on the shared I/O pool; results keep input order."""
+    return list(_IO_POOL.map(lambda fn: fn(), fns))
+
 
 # --- Helper Functions ---
 def _get_gcs_client():
@@ -155,6 +310,19 @@ def _get_gcs_client():
     if _gcs_client:
         return _gcs_client
 
+    # Credential loading is not thread-safe; only the first caller builds the client
+    with _gcs_client_lock:
+        if _gcs_client is None:
+            _gcs_client = _create_gcs_client()
+
+    return _gcs_client
+
+
+def _create_gcs_client():
+    # Imported here so workers that never touch GCS don't load the client stack
+    from google.cloud import storage
+    from google.oauth2 import service_account
+
     credentials = None
     json_env = (GCS_SERVICE_ACCOUNT_JSON or "").strip()
 
@@ -182,8 +350,7 @@ def _get_gcs_client():
             raise
 
     if credentials is None and GOOGLE_APPLICATION_CREDENTIALS:
-        _gcs_client = storage.Client()
-        return _gcs_client
+        return storage.Client()
 
     if credentials is None:
         raise RuntimeError(
@@ -192,8 +359,17 @@ def _get_gcs_client():
         )
 
     project_id = getattr(credentials, "project_id", None)
-    _gcs_client = storage.Client(credentials=credentials, project=project_id)
-    return _gcs_client
+    return storage.Client(credentials=credentials, project=project_id)
+
+
+def _get_gcs_bucket(bucket_name):
+    """Return a cached bucket handle; existence is not checked until an upload hits it."""
+    bucket = _gcs_bucket_cache.get(bucket_name)
+
+    if bucket is None:
+        bucket = _gcs_bucket_cache.setdefault(bucket_name, _get_gcs_client().bucket(bucket_name))
+
+    return bucket
 
 
 def _parse_iso_datetime(value):
@@ -230,6 +406,279 @@ def _generate_invite_code():
     return uuid.uuid4().hex[:10].upper()
 
 
+def _json_list_response(list_key, items, extra, status=200):
+    """
+    Respond with the JSON object `{list_key: items, **extra}`, encoding one list item at
+    a time as the body is sent so a large list is never held as a single string.
+    """
+    dumps = app.json.dumps
+
+    def chunks():
+        yield "{" + dumps(list_key) + ":["
+        for i, item in enumerate(items):
+            yield ("," if i else "") + dumps(item)
+        yield "]"
+        for key, value in extra.items():
+            yield "," + dumps(key) + ":" + dumps(value)
+        yield "}\n"
+
+    return app.response_class(chunks(), status=status, mimetype="application/json")
+
+
+def _static_json_response(body, status=200):
+    """Response for a JSON body that was serialized ahead of time (fixed error payloads)."""
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+def _json_dumps(obj, indent=False):
+    """Serialize to a UTF-8 JSON string (non-ASCII unescaped), with orjson when available."""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option).decode()
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def _json_loads(data):
+    """Parse JSON from str or bytes with orjson when available; errors subclass json.JSONDecodeError."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@lru_cache(maxsize=None)
+def _admin_headers(service_key):
+    """Read-only Supabase admin API headers for a service key (built once per key)."""
+    return MappingProxyType(
+        {
+            "apikey": service_key,
+            "Authorization": f"Bearer {service_key}",
+            "Content-Type": "application/json",
+        }
+    )
+
+
+def _chunk_texts_for_azure(texts):
+    """
+    Split texts into consecutive chunks that respect Azure Translator's
+    per-request item and character limits.
+    """
+    chunks = []
+    start = 0
+    size = 0
+
+    for idx, text in enumerate(texts):
+        count = idx - start
+        if count and (count >= AZURE_TRANSLATOR_CHUNK_SIZE or size + len(text) > 9000):
+            chunks.append(texts[start:idx])
+            start = idx
+            size = 0
+        size += len(text)
+
+    if start < len(texts):
+        chunks.append(texts[start:])
+
+    return chunks
+
+
+def _translate_chunk(url, headers, chunk):
+    body = [{"Text": t} for t in chunk]
+    with _translator_slots:
+        if ORJSON_AVAILABLE:
+            # headers already carry Content-Type: application/json
+            resp = _http_session.post(
+                url, headers=headers, data=orjson.dumps(body), timeout=AZURE_TRANSLATOR_TIMEOUT
+            )
+        else:
+            resp = _http_session.post(
+                url, headers=headers, json=body, timeout=AZURE_TRANSLATOR_TIMEOUT
+            )
+    resp.raise_for_status()
+    return orjson.loads(resp.content) if ORJSON_AVAILABLE else resp.json()
+
+
+_LETTER_RE = re.compile(r"[^\W\d_]")
+
+
+def _needs_translation(text):
+    """False for empty, numeric or placeholder/punctuation-only strings Azure would echo back."""
+    return bool(text) and _LETTER_RE.search(_PLACEHOLDER_RE.sub("", text)) is not None
+
+
+def _azure_translate_texts(texts, target):
+    """
+    Translate a list of strings with Azure Translator.
+
+    Strings with nothing to translate are passed through without a request, and
+    repeated strings (group names, common ingredients, tags) are served from an
+    in-process LRU cache keyed by (text, target); only the distinct misses are sent
+    to Azure. The returned Azure translation items are in the same order as `texts`.
+    """
+    if not texts:
+        return []
+
+    translations = [None] * len(texts)
+    misses = {}  # text -> indices in `texts` waiting on it
+
+    with _translation_cache_lock:
+        for idx, text in enumerate(texts):
+            if not _needs_translation(text):
+                translations[idx] = {"translations": [{"text": text, "to": target}]}
+                continue
+
+            trans_item = _translation_cache.get((text, target))
+            if trans_item is None:
+                misses.setdefault(text, []).append(idx)
+            else:
+                _translation_cache.move_to_end((text, target))
+                translations[idx] = trans_item
+
+    if not misses:
+        return translations
+
+    miss_texts = list(misses)
+    miss_translations = _azure_translate_uncached(miss_texts, target)
+
+    with _translation_cache_lock:
+        for text, trans_item in zip(miss_texts, miss_translations):
+            _translation_cache[(text, target)] = trans_item
+            for idx in misses[text]:
+                translations[idx] = trans_item
+        while len(_translation_cache) > TRANSLATION_CACHE_SIZE:
+            _translation_cache.popitem(last=False)
+
+    return translations
+
+
+def _azure_translate_uncached(texts, target):
+    """
+    Send texts to Azure Translator, dispatching chunks concurrently on the shared I/O
+    pool. Returns the Azure translation items in the same order as `texts`.
+    """
+    url = f"{_AZURE_TRANSLATE_URL}&to={target}"
+    headers = _AZURE_TRANSLATOR_HEADERS
+    chunks = _chunk_texts_for_azure(texts)
+
+    if len(chunks) == 1:
+        return _translate_chunk(url, headers, texts)
+
+    results = _gather(
+        [lambda chunk=chunk: _translate_chunk(url, headers, chunk) for chunk in chunks]
+    )
+    return [item for items in results for item in items]
+
+
+class _TranslateBatcher:
+    """
+    Coalesces concurrent single-text translations into shared Azure Translator calls.
+
+    Callers enqueue (text, target) and block on a Future. A background thread drains
+    the queue until it has `max_items` texts or `window` seconds have passed, then
+    hands one request per target language to its own small pool, so target languages
+    go out in parallel and a slow call never holds up the next window. The pool is
+    separate from _IO_POOL because _azure_translate_texts fans chunks out there.
+    """
+
+    def __init__(self, max_items=100, window=AZURE_TRANSLATOR_BATCH_WINDOW, max_pending=1000,
+                 max_workers=4):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._max_items = max_items
+        self._window = window
+        self._thread = None
+        self._lock = threading.Lock()
+        # Worker threads start on first submit, so forked workers don't inherit any
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translate-flush")
+        atexit.register(self._executor.shutdown, wait=False)
+
+    def _ensure_started(self):
+        # Started lazily so forked gunicorn workers each get their own thread
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="translate-batcher", daemon=True
+                    )
+                    self._thread.start()
+
+    def translate(self, text, target, timeout=AZURE_TRANSLATOR_BATCH_TIMEOUT):
+        """Return the Azure translation item for `text`, batched with concurrent callers."""
+        self._ensure_started()
+        future = Future()
+
+        try:
+            self._queue.put_nowait((text, target, future))
+        except queue.Full:
+            # Batcher is saturated; don't make this request wait behind the backlog
+            return _azure_translate_texts([text], target)[0]
+
+        return future.result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._window
+
+            while len(batch) < self._max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        by_target = {}
+        for text, target, future in batch:
+            by_target.setdefault(target, []).append((text, future))
+
+        for target, items in by_target.items():
+            self._executor.submit(self._translate_target, target, items)
+
+    @staticmethod
+    def _translate_target(target, items):
+        try:
+            translations = _azure_translate_texts([text for text, _ in items], target)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        # A short response must fail the unmatched callers now, not at their timeout
+        for i, (text, future) in enumerate(items):
+            trans_item = translations[i] if i < len(translations) else None
+            if trans_item is None:
+                future.set_exception(RuntimeError(f"Azure Translator returned no translation for '{text}'"))
+            else:
+                future.set_result(trans_item)
+
+
+_translate_batcher = _TranslateBatcher()
+
+
+def _upload_large_file_to_gcs(stream, blob, content_type):
+    """
+    Upload a large file as concurrently sent parts (XML multipart upload) that GCS
+    assembles server-side. The transfer manager reads parts by filename, so the
+    request stream is spooled to a named temp file first.
+    """
+    from google.cloud.storage import transfer_manager
+
+    with tempfile.NamedTemporaryFile(suffix=".upload") as tmp:
+        shutil.copyfileobj(stream, tmp, GCS_UPLOAD_CHUNK_SIZE)
+        tmp.flush()
+
+        transfer_manager.upload_chunks_concurrently(
+            tmp.name,
+            blob,
+            content_type=content_type,
+            chunk_size=GCS_PARALLEL_UPLOAD_CHUNK_SIZE,
+            max_workers=GCS_PARALLEL_UPLOAD_MAX_WORKERS,
+            worker_type=transfer_manager.THREAD,
+        )
+
+
 @app.route("/api/chat/uploads", methods=["POST"])
 def api_chat_upload_media():
     """
@@ -254,34 +703,34 @@ def api_chat_upload_media():
     priority = request.form.get("priority")
 
     try:
-        client = _get_gcs_client()
-        bucket = client.bucket(bucket_name)
+        from google.api_core.exceptions import NotFound
 
-        if not bucket.exists(client=client):
-            return jsonify({"error": f"GCS bucket '{bucket_name}' does not exist"}), 400
+        bucket = _get_gcs_bucket(bucket_name)
 
         safe_name = secure_filename(file_obj.filename) or "upload"
         _, ext = os.path.splitext(safe_name)
-        timestamp = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
-        unique_id = uuid.uuid4().hex
-        folder_parts = [part for part in folder.split("/") if part]
-        path_parts = ["web"]
-
-        if user_code:
-            path_parts.append(user_code)
-        elif folder_parts:
-            path_parts.extend(folder_parts)
-
-        object_name = "/".join(path_parts + [f"{timestamp}-{unique_id}{ext}"])
+        now = datetime.datetime.now(_UTC)
+        file_name = (
+            f"{now.year}{now.month:02d}{now.day:02d}{now.hour:02d}{now.minute:02d}"
+            f"{now.second:02d}-{uuid.uuid4().hex}{ext}"
+        )
+        prefix = user_code or "/".join(part for part in folder.split("/") if part)
+        object_name = f"web/{prefix}/{file_name}" if prefix else f"web/{file_name}"
         blob = bucket.blob(object_name)
         blob.cache_control = "public, max-age=3600"
-        file_obj.stream.seek(0)
+        content_type = file_obj.mimetype or "application/octet-stream"
 
-        blob.upload_from_file(
-            file_obj.stream,
-            content_type=file_obj.mimetype or "application/octet-stream",
-            rewind=True,
-        )
+        try:
+            if (request.content_length or 0) >= GCS_PARALLEL_UPLOAD_THRESHOLD:
+                _upload_large_file_to_gcs(file_obj.stream, blob, content_type)
+            else:
+                # Resumable upload in fixed-size chunks so the stream is consumed once
+                # without buffering the whole file for the request to GCS.
+                blob.chunk_size = GCS_UPLOAD_CHUNK_SIZE
+                blob.upload_from_file(file_obj.stream, content_type=content_type, rewind=False)
+        except NotFound:
+            _gcs_bucket_cache.pop(bucket_name, None)
+            return jsonify({"error": f"GCS bucket '{bucket_name}' does not exist"}), 400
 
         # Attempt to make the object public for direct access.
         try:
@@ -297,7 +746,7 @@ def api_chat_upload_media():
             "url": public_url,
             "path": object_name,
             "bucket": bucket_name,
-            "content_type": file_obj.mimetype or "application/octet-stream",
+            "content_type": content_type,
             "size": getattr(file_obj, "content_length", None),
             "priority": priority,
         }
@@ -354,30 +803,48 @@ def api_delete_second_auth_user():
             logger.error("❌ Neither user_id nor email provided")
             return jsonify({"error": "Either user_id or email is required"}), 400
 
-        admin_headers = {
-            "apikey": second_supabase_key,
-            "Authorization": f"Bearer {second_supabase_key}",
-            "Content-Type": "application/json",
-        }
+        admin_headers = _admin_headers(second_supabase_key)
 
-        # If we don't have user_id, look it up by email first
-        if not user_id and email:
+        email_key = email.strip().lower() if email else None
+
+        # If we don't have user_id, use a cached lookup or look it up by email first
+        if not user_id and email_key:
+            with _second_auth_user_ids_lock:
+                user_id = _second_auth_user_ids.get(email_key)
+            if user_id:
+                logger.info("✅ Using cached auth user_id %s for email %s", user_id, email)
+
+        if not user_id and email_key:
             try:
                 logger.info("🔍 Looking up user by email: %s", email)
-                lookup_url = f"{base_url}/auth/v1/admin/users?email={email}"
+                lookup_url = f"{base_url}/auth/v1/admin/users"
                 logger.info("🔍 Lookup URL: %s", lookup_url)
-                lookup_response = requests.get(
+                lookup_response = _supabase_http.get(
                     lookup_url,
                     headers=admin_headers,
+                    params={"email": email},
                     timeout=15,
                 )
                 logger.info("📥 Lookup response status: %s", lookup_response.status_code)
                 if lookup_response.status_code == 200:
                     lookup_data = lookup_response.json()
-                    logger.info("📥 Lookup response data: %s", lookup_data)
-                    if lookup_data.get("users") and len(lookup_data["users"]) > 0:
-                        user_id = lookup_data["users"][0]["id"]
+                    # The admin API may ignore the email filter and return a page of users,
+                    # so only accept an exact match rather than the first user returned
+                    user_id = next(
+                        (
+                            user["id"]
+                            for user in lookup_data.get("users") or []
+                            if (user.get("email") or "").lower() == email_key
+                        ),
+                        None,
+                    )
+                    if user_id:
                         logger.info("✅ Found auth user_id %s for email %s", user_id, email)
+                        with _second_auth_user_ids_lock:
+                            _second_auth_user_ids[email_key] = user_id
+                            _second_auth_user_ids.move_to_end(email_key)
+                            if len(_second_auth_user_ids) > SECOND_AUTH_USER_ID_CACHE_SIZE:
+                                _second_auth_user_ids.popitem(last=False)
                     else:
                         logger.warning("⚠️ No users found for email %s", email)
                 else:
@@ -395,7 +862,7 @@ def api_delete_second_auth_user():
             delete_endpoint = f"{base_url}/auth/v1/admin/users/{user_id}"
             logger.info("🗑️ Attempting to delete auth user at: %s", delete_endpoint)
 
-            delete_response = requests.delete(
+            delete_response = _supabase_http.delete(
                 delete_endpoint,
                 headers=admin_headers,
                 timeout=15,
@@ -404,6 +871,10 @@ def api_delete_second_auth_user():
             logger.info("📥 Delete response status: %s", delete_response.status_code)
             logger.info("📥 Delete response text: %s", delete_response.text)
 
+            if email_key and delete_response.status_code in (200, 204, 404):
+                with _second_auth_user_ids_lock:
+                    _second_auth_user_ids.pop(email_key, None)
+
             if delete_response.status_code == 200 or delete_response.status_code == 204:
                 logger.info(
                     "✅ Successfully deleted auth user from second Supabase for user_id %s", user_id
@@ -462,7 +933,7 @@ def api_auth_register():
     if not email or not password or not name or not invite_code:
         return jsonify({"error": "Missing required fields"}), 400
 
-    now_utc = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+    now_utc = datetime.datetime.now(_UTC)
 
     try:
         invite_response = (
@@ -511,11 +982,7 @@ def api_auth_register():
     target_company_id = company_id or invite.get("company_id")
     target_role = invite.get("role") or "employee"
 
-    admin_headers = {
-        "apikey": supabase_key,
-        "Authorization": f"Bearer {supabase_key}",
-        "Content-Type": "application/json",
-    }
+    admin_headers = _admin_headers(supabase_key)
 
     auto_confirm = SUPABASE_AUTO_CONFIRM
     verification_redirect = SUPABASE_EMAIL_REDIRECT_URL
@@ -534,7 +1001,7 @@ def api_auth_register():
         }
 
         try:
-            admin_resp = requests.post(
+            admin_resp = _supabase_http.post(
                 f"{supabase_url}/auth/v1/admin/users",
                 headers=admin_headers,
                 json=admin_payload,
@@ -581,7 +1048,7 @@ def api_auth_register():
             signup_url = f"{supabase_url}/auth/v1/signup"
             params = {"redirect_to": verification_redirect} if verification_redirect else None
 
-            signup_resp = requests.post(
+            signup_resp = _supabase_http.post(
                 signup_url,
                 headers=admin_headers,
                 json=signup_payload,
@@ -621,16 +1088,12 @@ def api_auth_register():
         "company_id": target_company_id,
     }
 
-    try:
+    def _insert_profile():
         profile_resp = supabase.table("profiles").insert(profile_payload).execute()
         if getattr(profile_resp, "error", None):
             raise Exception(profile_resp.error)
-    except Exception as err:
-        logger.error("Failed to create profile for %s: %s", user_id, err)
-        return jsonify({"error": "Unable to create user profile"}), 500
-
-    try:
 
+    def _mark_invite_used():
         supabase.table("registration_invites").update(
             {
                 "used_at": now_utc.isoformat(),
@@ -638,169 +1101,289 @@ def api_auth_register():
             }
         ).eq("id", invite.get("id")).execute()
 
-    except Exception as err:
+    # The profile insert and invite update are independent once user_id is known
+    profile_future = _IO_POOL.submit(_insert_profile)
+    invite_future = _IO_POOL.submit(_mark_invite_used)
 
+    try:
+        invite_future.result()
+    except Exception as err:
         logger.warning("Failed to mark invite %s as used: %s", invite.get("id"), err)
 
+    try:
+        profile_future.result()
+    except Exception as err:
+        logger.error("Failed to create profile for %s: %s", user_id, err)
+
+        # Best-effort rollback: free the invite again and remove the orphaned auth user
+        try:
+            supabase.table("registration_invites").update(
+                {"used_at": None, "used_by": None}
+            ).eq("id", invite.get("id")).execute()
+        except Exception as cleanup_err:
+            logger.warning("Failed to release invite %s: %s", invite.get("id"), cleanup_err)
+
+        try:
+            _supabase_http.delete(
+                f"{supabase_url}/auth/v1/admin/users/{user_id}",
+                headers=admin_headers,
+                timeout=15,
+            )
+        except Exception as cleanup_err:
+            logger.warning("Failed to remove auth user %s: %s", user_id, cleanup_err)
+
+        return jsonify({"error": "Unable to create user profile"}), 500
+
     return jsonify({"success": True, "user_id": user_id, "role": target_role}), 201
 
 
+def _compile_custom_terms_re(words, flags=re.IGNORECASE):
+    """Compile custom terms into a single whole-word alternation (longest first)."""
+    return re.compile(r"(?<!\w)(" + "|".join(re.escape(w) for w in words) + r")(?!\w)", flags)
+
+
+class _CustomTermMatcher:
+    """
+    Finds custom terms in text as whole words, case-insensitively, preferring the
+    leftmost and then the longest match (the same result as the regex alternation).
+    Uses an Aho-Corasick automaton when pyahocorasick is installed, so matching cost
+    does not grow with the number of terms; otherwise falls back to the regex.
+    """
+
+    def __init__(self, words):
+        self.pattern = _compile_custom_terms_re(words)
+        # Case-sensitive twin over the lower-cased terms, run against pre-lowered text
+        # so the regex engine does not case-fold every character
+        self.lower_pattern = _compile_custom_terms_re([w.lower() for w in words], flags=0)
+        self.automaton = None
+
+        if AHOCORASICK_AVAILABLE:
+            self.automaton = ahocorasick.Automaton()
+            for word in words:
+                self.automaton.add_word(word.lower(), len(word))
+            self.automaton.make_automaton()
+
+    def spans(self, text):
+        """Return non-overlapping (start, end) spans of custom terms in text."""
+        lowered = text.lower()
+        # Lower-casing can change length for a few characters; offsets would not line up
+        if len(lowered) != len(text):
+            return [match.span() for match in self.pattern.finditer(text)]
+        if self.automaton is None:
+            return [match.span() for match in self.lower_pattern.finditer(lowered)]
+
+        candidates = []
+        for end_idx, length in self.automaton.iter(lowered):
+            start, end = end_idx - length + 1, end_idx + 1
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            candidates.append((start, -length))
+
+        spans = []
+        last_end = 0
+        for start, neg_length in sorted(candidates):
+            if start >= last_end:
+                last_end = start - neg_length
+                spans.append((start, last_end))
+
+        return spans
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+def _replace_custom_terms(text, matcher, custom_map):
+    """
+    Replace each mapped phrase/word with a unique placeholder in a single pass.
+    Returns (text_with_placeholders, [hebrew, ...]) where __CUSTOMWORD{i}__ maps to item i.
+    """
+    spans = matcher.spans(text)
+    if not spans:
+        return text, []
+
+    ph_terms = []
+    parts = []
+    pos = 0
+
+    for start, end in spans:
+        parts.append(text[pos:start])
+        parts.append(f"__CUSTOMWORD{len(ph_terms)}__")
+        ph_terms.append(custom_map[text[start:end].lower()])
+        pos = end
+
+    parts.append(text[pos:])
+    return "".join(parts), ph_terms
+
+
+_PLACEHOLDER_RE = re.compile(r"__CUSTOMWORD(\d+)__")
+
+
+def _restore_placeholders(translated, ph_terms):
+    """Swap custom-term placeholders in a translated string back to their Hebrew terms."""
+    if not ph_terms:
+        return translated
+
+    def repl_func(match):
+        idx = int(match.group(1))
+        return ph_terms[idx] if idx < len(ph_terms) else match.group(0)
+
+    return _PLACEHOLDER_RE.sub(repl_func, translated)
+
+
+# Custom translation mapping for specific food terms (phrases first, then single words)
+_RECIPE_CUSTOM_TERMS = [
+    {"en": "Whole Wheat Toast", "he": "טוסט חיטה מלאה"},
+    {"en": "Egg Wrap", "he": "טורטייה ממולאת ביצה"},
+    {"en": "Veggie Wrap", "he": "טורטייה ממולאת ירקות"},
+    {"en": "Egg and Veggie Wrap", "he": "טורטייה ממולאת ביצה וירקות"},
+    # ... add more phrases as needed ...
+    {"en": "Wrap", "he": "טורטייה ממולאת"},
+    {"en": "Roll", "he": "לחמנייה"},
+    {"en": "Pocket", "he": "כיס פיתה"},
+    {"en": "Bar", "he": "חטיף"},
+    {"en": "Chips", "he": "צ'יפס / קריספס"},
+    {"en": "Biscuit", "he": "ביסקוויט / עוגייה"},
+    {"en": "Cookie", "he": "עוגייה"},
+    {"en": "Pudding", "he": "פודינג"},
+    {"en": "Mousse", "he": "מוס"},
+    {"en": "Dressing", "he": "רוטב לסלט"},
+    {"en": "Entrée", "he": "מנה עיקרית / מנת פתיחה"},
+    {"en": "Starter", "he": "מנה ראשונה"},
+    {"en": "Batter", "he": "בלילה"},
+    {"en": "Toast", "he": "טוסט"},
+    {"en": "Jam", "he": "ריבה"},
+    {"en": "Roll-up", "he": "חטיף גליל"},
+    {"en": "Popsicle", "he": "ארטיק"},
+    {"en": "Cider", "he": "סיידר / מיץ תפוחים"},
+    {"en": "Cereal", "he": "דגני בוקר"},
+    {"en": "Stew", "he": "תבשיל"},
+]
+
+# Built once per process and frozen, since every request shares them.
+# Sort terms by length of English phrase, descending (longest first)
+_RECIPE_CUSTOM_TERMS = tuple(sorted(_RECIPE_CUSTOM_TERMS, key=lambda t: -len(t["en"])))
+_RECIPE_CUSTOM_MAP = MappingProxyType({t["en"].lower(): t["he"] for t in _RECIPE_CUSTOM_TERMS})
+_RECIPE_CUSTOM_WORDS = tuple(t["en"] for t in _RECIPE_CUSTOM_TERMS)
+_RECIPE_CUSTOM_MATCHER = _CustomTermMatcher(_RECIPE_CUSTOM_WORDS)
+
+# Custom translation mapping for food-related terms used by /api/translate-text
+_TEXT_CUSTOM_TERMS = [
+    {"en": "Based on", "he": "מבוסס על"},
+    {"en": "food log entries", "he": "רשומות יומן מזון"},
+    {"en": "this user frequently consumes", "he": "משתמש זה צורך לעתים קרובות"},
+    {"en": "Meal patterns", "he": "דפוסי ארוחות"},
+    {"en": "times", "he": "פעמים"},
+    {"en": "Breakfast", "he": "ארוחת בוקר"},
+    {"en": "Lunch", "he": "ארוחת צהריים"},
+    {"en": "Dinner", "he": "ארוחת ערב"},
+    {"en": "Snack", "he": "חטיף"},
+    {"en": "Morning Snack", "he": "חטיף בוקר"},
+    {"en": "Afternoon Snack", "he": "חטיף צהריים"},
+    {"en": "Evening Snack", "he": "חטיף ערב"},
+    {"en": "Mid-Morning Snack", "he": "חטיף אמצע בוקר"},
+    {"en": "Mid-Afternoon Snack", "he": "חטיף אמצע צהריים"},
+    {"en": "Late Night Snack", "he": "חטיף לילה מאוחר"},
+    {"en": "entries", "he": "רשומות"},
+    {"en": "entry", "he": "רשומה"},
+    {"en": "frequently", "he": "לעתים קרובות"},
+    {"en": "consumes", "he": "צורך"},
+    {"en": "user", "he": "משתמש"},
+    {"en": "patterns", "he": "דפוסים"},
+    {"en": "meal", "he": "ארוחה"},
+    {"en": "meals", "he": "ארוחות"},
+]
+
+_TEXT_CUSTOM_TERMS = tuple(sorted(_TEXT_CUSTOM_TERMS, key=lambda t: -len(t["en"])))
+_TEXT_CUSTOM_MAP = MappingProxyType({t["en"].lower(): t["he"] for t in _TEXT_CUSTOM_TERMS})
+_TEXT_CUSTOM_WORDS = tuple(t["en"] for t in _TEXT_CUSTOM_TERMS)
+_TEXT_CUSTOM_MATCHER = _CustomTermMatcher(_TEXT_CUSTOM_WORDS)
+
+
 @app.route("/api/translate-recipes", methods=["POST"])
 def api_translate_recipes():
     data = request.get_json()
     recipes = data.get("recipes", [])
     target = data.get("targetLang", "he")
 
-    # Custom translation mapping for specific food terms (phrases first, then single words)
-
-    custom_terms = [
-        {"en": "Whole Wheat Toast", "he": "טוסט חיטה מלאה"},
-        {"en": "Egg Wrap", "he": "טורטייה ממולאת ביצה"},
-        {"en": "Veggie Wrap", "he": "טורטייה ממולאת ירקות"},
-        {"en": "Egg and Veggie Wrap", "he": "טורטייה ממולאת ביצה וירקות"},
-        # ... add more phrases as needed ...
-        {"en": "Wrap", "he": "טורטייה ממולאת"},
-        {"en": "Roll", "he": "לחמנייה"},
-        {"en": "Pocket", "he": "כיס פיתה"},
-        {"en": "Bar", "he": "חטיף"},
-        {"en": "Chips", "he": "צ'יפס / קריספס"},
-        {"en": "Biscuit", "he": "ביסקוויט / עוגייה"},
-        {"en": "Cookie", "he": "עוגייה"},
-        {"en": "Pudding", "he": "פודינג"},
-        {"en": "Mousse", "he": "מוס"},
-        {"en": "Dressing", "he": "רוטב לסלט"},
-        {"en": "Entrée", "he": "מנה עיקרית / מנת פתיחה"},
-        {"en": "Starter", "he": "מנה ראשונה"},
-        {"en": "Batter", "he": "בלילה"},
-        {"en": "Toast", "he": "טוסט"},
-        {"en": "Jam", "he": "ריבה"},
-        {"en": "Roll-up", "he": "חטיף גליל"},
-        {"en": "Popsicle", "he": "ארטיק"},
-        {"en": "Cider", "he": "סיידר / מיץ תפוחים"},
-        {"en": "Cereal", "he": "דגני בוקר"},
-        {"en": "Stew", "he": "תבשיל"},
-    ]
-
-    # Sort terms by length of English phrase, descending (longest first)
-    custom_terms.sort(key=lambda t: -len(t["en"]))
-    custom_map = {t["en"].lower(): t["he"] for t in custom_terms}
-    custom_words = [t["en"] for t in custom_terms]
-
-    # 1. Gather every string you want to translate from recipes structure
-    texts = []
-    paths = []
+    # 1. Gather every string you want to translate from recipes structure, and remember
+    #    the container and key it is written back to (parallel lists). The parsed request body is owned by
+    #    this request, so translations are applied in place instead of to a deepcopy.
+    #    A cheap count pass sizes the lists up front; they are then filled by index.
+    n = sum(
+        1
+        + sum(
+            1
+            + bool(recipe.get("tips"))
+            + len(recipe.get("instructions", []))
+            + len(recipe.get("ingredients", []))
+            + len(recipe.get("tags", []))
+            for recipe in group.get("recipes", [])
+        )
+        for group in recipes
+    )
+    texts = [None] * n
+    containers = [None] * n
+    keys = [None] * n
+    i = 0
 
-    for gi, group in enumerate(recipes):
+    for group in recipes:
         # Translate group name
-        texts.append(group.get("group", ""))
-        paths.append(("groups", gi, "group"))
+        texts[i] = group.get("group", "")
+        containers[i] = group
+        keys[i] = "group"
+        i += 1
 
-        for ri, recipe in enumerate(group.get("recipes", [])):
+        for recipe in group.get("recipes", []):
             # Translate recipe title
-            texts.append(recipe.get("title", ""))
-            paths.append(("groups", gi, "recipes", ri, "title"))
+            texts[i] = recipe.get("title", "")
+            containers[i] = recipe
+            keys[i] = "title"
+            i += 1
 
             # Translate recipe tips
             if recipe.get("tips"):
-                texts.append(recipe.get("tips", ""))
-                paths.append(("groups", gi, "recipes", ri, "tips"))
-
-            # Translate recipe instructions
-            for ii, instruction in enumerate(recipe.get("instructions", [])):
-                texts.append(instruction)
-                paths.append(("groups", gi, "recipes", ri, "instructions", ii))
-
-            # Translate recipe ingredients
-            for ii, ingredient in enumerate(recipe.get("ingredients", [])):
-                texts.append(ingredient)
-                paths.append(("groups", gi, "recipes", ri, "ingredients", ii))
-
-            # Translate recipe tags
-            for ti, tag in enumerate(recipe.get("tags", [])):
-                texts.append(tag)
-                paths.append(("groups", gi, "recipes", ri, "tags", ti))
+                texts[i] = recipe.get("tips", "")
+                containers[i] = recipe
+                keys[i] = "tips"
+                i += 1
+
+            # Translate recipe instructions, ingredients and tags
+            for field in ("instructions", "ingredients", "tags"):
+                items = recipe.get(field, [])
+                count = len(items)
+                texts[i : i + count] = items
+                containers[i : i + count] = [items] * count
+                keys[i : i + count] = range(count)
+                i += count
 
     # 2. For Hebrew: replace mapped phrases/words with placeholders, send to Azure, then restore
-    placeholder_map = []  # List of dicts: {ph: hebrew}
+    placeholder_map = []  # Per text: Hebrew terms indexed by placeholder number
     texts_for_azure = []
 
     if target == "he":
-        for i, t in enumerate(texts):
-            orig = t
-            ph_map = {}
-            ph_idx = 0
-
+        for t in texts:
             # Replace each mapped phrase/word with a unique placeholder (longest first)
-            def repl_func(match):
-                nonlocal ph_idx
-                en_word = match.group(0)
-                ph = f"__CUSTOMWORD{ph_idx}__"
-                ph_map[ph] = custom_map[en_word.lower()]
-                ph_idx += 1
-                return ph
-
-            for en_word in custom_words:
-                pattern = r"(?<!\w)" + re.escape(en_word) + r"(?!\w)"
-                t = re.sub(pattern, repl_func, t, flags=re.IGNORECASE)
-
-            placeholder_map.append(ph_map)
+            t, ph_terms = _replace_custom_terms(t, _RECIPE_CUSTOM_MATCHER, _RECIPE_CUSTOM_MAP)
+            placeholder_map.append(ph_terms)
             texts_for_azure.append(t)
     else:
         texts_for_azure = texts
-        placeholder_map = [{} for _ in texts]
-
-    # 3. Call Azure Translator in bulk
-    endpoint = AZURE_TRANSLATOR_ENDPOINT
-    key = AZURE_TRANSLATOR_KEY
-    region = AZURE_TRANSLATOR_REGION
-
-    url = f"{endpoint}/translate?api-version=3.0&to={target}"
-    headers = {
-        "Ocp-Apim-Subscription-Key": key,
-        "Ocp-Apim-Subscription-Region": region,
-        "Content-Type": "application/json",
-    }
+        placeholder_map = [[] for _ in texts]
 
-    body = [{"Text": t} for t in texts_for_azure]
-    translations = []
-
-    if body:
-        resp = requests.post(url, headers=headers, json=body)
-        resp.raise_for_status()
-        translations = resp.json()  # a list, same length as body
-
-    # 4. Restore placeholders with Hebrew terms and apply to new structure
-    new_recipes = deepcopy(recipes)
+    # 3. Call Azure Translator in concurrent chunks (a list, same length as texts_for_azure)
+    translations = _azure_translate_texts(texts_for_azure, target)
 
+    # 4. Restore placeholders with Hebrew terms and write each translation back in place
     for idx, trans_item in enumerate(translations):
-        translated = trans_item["translations"][0]["text"]
-
-        # Replace placeholders with Hebrew
-        for ph, heb in placeholder_map[idx].items():
-            translated = translated.replace(ph, heb)
-
-        # Apply translation to the correct path in new_recipes
-        path = paths[idx]
-        obj = new_recipes
-
-        for key in path[:-1]:
-            if isinstance(key, int):
-                obj = obj[key]
-            elif key == "groups":
-                continue  # Skip the "groups" prefix
-            else:
-                obj = obj[key]
-
-        # Set the translated value
-        final_key = path[-1]
-
-        if isinstance(obj, list) and isinstance(final_key, int):
-            obj[final_key] = translated
-        else:
-            obj[final_key] = translated
+        containers[idx][keys[idx]] = _restore_placeholders(
+            trans_item["translations"][0]["text"], placeholder_map[idx]
+        )
 
     # Clean ingredient names before returning (if recipes contain ingredient data)
-    cleaned_recipes = clean_ingredient_names({"recipes": new_recipes}).get("recipes", new_recipes)
+    cleaned_recipes = clean_ingredient_names({"recipes": recipes}).get("recipes", recipes)
 
     return jsonify({"recipes": cleaned_recipes})
 @app.route("/api/translate-text", methods=["POST"])
@@ -815,95 +1398,34 @@ def api_translate_text():
         if not text or not text.strip():
             return jsonify({"translatedText": text})
 
-        # Custom translation mapping for food-related terms
-
-        custom_terms = [
-            {"en": "Based on", "he": "מבוסס על"},
-            {"en": "food log entries", "he": "רשומות יומן מזון"},
-            {"en": "this user frequently consumes", "he": "משתמש זה צורך לעתים קרובות"},
-            {"en": "Meal patterns", "he": "דפוסי ארוחות"},
-            {"en": "times", "he": "פעמים"},
-            {"en": "Breakfast", "he": "ארוחת בוקר"},
-            {"en": "Lunch", "he": "ארוחת צהריים"},
-            {"en": "Dinner", "he": "ארוחת ערב"},
-            {"en": "Snack", "he": "חטיף"},
-            {"en": "Morning Snack", "he": "חטיף בוקר"},
-            {"en": "Afternoon Snack", "he": "חטיף צהריים"},
-            {"en": "Evening Snack", "he": "חטיף ערב"},
-            {"en": "Mid-Morning Snack", "he": "חטיף אמצע בוקר"},
-            {"en": "Mid-Afternoon Snack", "he": "חטיף אמצע צהריים"},
-            {"en": "Late Night Snack", "he": "חטיף לילה מאוחר"},
-            {"en": "entries", "he": "רשומות"},
-            {"en": "entry", "he": "רשומה"},
-            {"en": "frequently", "he": "לעתים קרובות"},
-            {"en": "consumes", "he": "צורך"},
-            {"en": "user", "he": "משתמש"},
-            {"en": "patterns", "he": "דפוסים"},
-            {"en": "meal", "he": "ארוחה"},
-            {"en": "meals", "he": "ארוחות"},
-        ]
-
-        # Sort terms by length of English phrase, descending (longest first)
-        custom_terms.sort(key=lambda t: -len(t["en"]))
-        custom_map = {t["en"].lower(): t["he"] for t in custom_terms}
-        custom_words = [t["en"] for t in custom_terms]
-
         # For Hebrew: replace mapped phrases/words with placeholders, send to Azure, then restore
         if target == "he":
-            ph_map = {}
-            ph_idx = 0
-
             # Replace each mapped phrase/word with a unique placeholder (longest first)
-            def repl_func(match):
-                nonlocal ph_idx
-                en_word = match.group(0)
-                ph = f"__CUSTOMWORD{ph_idx}__"
-                ph_map[ph] = custom_map[en_word.lower()]
-                ph_idx += 1
-                return ph
-
-            text_for_azure = text
-            for en_word in custom_words:
-                pattern = r"(?<!\w)" + re.escape(en_word) + r"(?!\w)"
-                text_for_azure = re.sub(pattern, repl_func, text_for_azure, flags=re.IGNORECASE)
+            text_for_azure, ph_terms = _replace_custom_terms(
+                text, _TEXT_CUSTOM_MATCHER, _TEXT_CUSTOM_MAP
+            )
 
         # For English: send Hebrew text directly to Azure without custom replacements
         elif target == "en":
             text_for_azure = text
-            ph_map = {}
+            ph_terms = []
         else:
             text_for_azure = text
-            ph_map = {}
+            ph_terms = []
 
         # Call Azure Translator
-        endpoint = AZURE_TRANSLATOR_ENDPOINT
-        key = AZURE_TRANSLATOR_KEY
-        region = AZURE_TRANSLATOR_REGION
-
-        if not all([endpoint, key, region]):
+        if not AZURE_TRANSLATOR_CONFIGURED:
             logger.error("Azure Translator environment variables not configured")
             return jsonify({"error": "Translation service not configured"}), 500
 
-        url = f"{endpoint}/translate?api-version=3.0&to={target}"
-        headers = {
-            "Ocp-Apim-Subscription-Key": key,
-            "Ocp-Apim-Subscription-Region": region,
-            "Content-Type": "application/json",
-        }
-
-        body = [{"Text": text_for_azure}]
-        resp = requests.post(url, headers=headers, json=body)
-        resp.raise_for_status()
-        translations = resp.json()
+        # Concurrent translate-text requests are coalesced into a single Azure call
+        trans_item = _translate_batcher.translate(text_for_azure, target)
 
-        if not translations:
+        if not trans_item:
             return jsonify({"translatedText": text})
 
-        translated = translations[0]["translations"][0]["text"]
-
         # Replace placeholders with Hebrew terms
-        for ph, heb in ph_map.items():
-            translated = translated.replace(ph, heb)
+        translated = _restore_placeholders(trans_item["translations"][0]["text"], ph_terms)
 
         return jsonify({"translatedText": translated})
 
@@ -912,6 +1434,82 @@ def api_translate_text():
         return jsonify({"error": f"Translation failed: {str(e)}"}), 500
 
 
+# Ingredient fields translation must never change: nutrition, gram amounts and product
+# identifiers (the "pruduct" typo matches the stored key)
+_PRESERVED_INGREDIENT_FIELDS = (
+    "calories",
+    "protein",
+    "fat",
+    "carbs",
+    "portionSI(gram)",
+    "brand of pruduct",
+    "UPC",
+)
+_MISSING = object()
+
+
+def _preserve_ingredient_fields(original_ings, translated_ings):
+    """Copy preserved fields from each original ingredient onto its translated counterpart."""
+    for original_ing, translated_ing in zip(original_ings, translated_ings):
+        if not isinstance(original_ing, dict) or not isinstance(translated_ing, dict):
+            continue
+        for field in _PRESERVED_INGREDIENT_FIELDS:
+            value = original_ing.get(field, _MISSING)
+            if value is not _MISSING:
+                translated_ing[field] = value
+
+
+# Translatable fields of a menu: True marks a string to translate, a dict describes a
+# nested object and a one-item list describes every element of a list
+_MENU_OPTION_SCHEMA = {
+    "meal_title": True,
+    "ingredients": [{"item": True, "household_measure": True}],
+}
+_MENU_TRANSLATION_SCHEMA = {
+    "note": True,
+    "meals": [
+        {
+            "meal": True,
+            "main": _MENU_OPTION_SCHEMA,
+            "alternative": _MENU_OPTION_SCHEMA,
+            "alternatives": [_MENU_OPTION_SCHEMA],
+        }
+    ],
+}
+
+
+def _copy_schema_texts(node, schema, texts, containers, keys):
+    """
+    Shallow-copy `node` along `schema` in one walk, appending each translatable string
+    with the copied container and key it is written back to. Returns the copy; parts
+    of the tree outside the schema are shared with the original.
+    """
+    node = node.copy()
+
+    for key, sub_schema in schema.items():
+        value = node.get(key)
+
+        if sub_schema is True:
+            if isinstance(value, str):
+                texts.append(value)
+                containers.append(node)
+                keys.append(key)
+        elif isinstance(sub_schema, list):
+            if isinstance(value, list):
+                node[key] = [
+                    (
+                        _copy_schema_texts(item, sub_schema[0], texts, containers, keys)
+                        if isinstance(item, dict)
+                        else item
+                    )
+                    for item in value
+                ]
+        elif isinstance(value, dict):
+            node[key] = _copy_schema_texts(value, sub_schema, texts, containers, keys)
+
+    return node
+
+
 @app.route("/api/translate", methods=["POST"])
 def api_translate_menu():
     """
@@ -925,218 +1523,54 @@ def api_translate_menu():
     menu = data.get("menu", {})
     target = data.get("targetLang", "he")
 
-    # Custom translation mapping for specific food terms (phrases first, then single words)
-
-    custom_terms = [
-        {"en": "Whole Wheat Toast", "he": "טוסט חיטה מלאה"},
-        {"en": "Egg Wrap", "he": "טורטייה ממולאת ביצה"},
-        {"en": "Veggie Wrap", "he": "טורטייה ממולאת ירקות"},
-        {"en": "Egg and Veggie Wrap", "he": "טורטייה ממולאת ביצה וירקות"},
-        # ... add more phrases as needed ...
-        {"en": "Wrap", "he": "טורטייה ממולאת"},
-        {"en": "Roll", "he": "לחמנייה"},
-        {"en": "Pocket", "he": "כיס פיתה"},
-        {"en": "Bar", "he": "חטיף"},
-        {"en": "Chips", "he": "צ'יפס / קריספס"},
-        {"en": "Biscuit", "he": "ביסקוויט / עוגייה"},
-        {"en": "Cookie", "he": "עוגייה"},
-        {"en": "Pudding", "he": "פודינג"},
-        {"en": "Mousse", "he": "מוס"},
-        {"en": "Dressing", "he": "רוטב לסלט"},
-        {"en": "Entrée", "he": "מנה עיקרית / מנת פתיחה"},
-        {"en": "Starter", "he": "מנה ראשונה"},
-        {"en": "Batter", "he": "בלילה"},
-        {"en": "Toast", "he": "טוסט"},
-        {"en": "Jam", "he": "ריבה"},
-        {"en": "Roll-up", "he": "חטיף גליל"},
-        {"en": "Popsicle", "he": "ארטיק"},
-        {"en": "Cider", "he": "סיידר / מיץ תפוחים"},
-        {"en": "Cereal", "he": "דגני בוקר"},
-        {"en": "Stew", "he": "תבשיל"},
-    ]
-
-    # Sort terms by length of English phrase, descending (longest first)
-
-    custom_terms.sort(key=lambda t: -len(t["en"]))
-    custom_map = {t["en"].lower(): t["he"] for t in custom_terms}
-    custom_words = [t["en"] for t in custom_terms]
-
-    # 1. Gather every string you want to translate, and remember its "path" in the object
+    # 1. Gather every string you want to translate, and remember the container and key
+    #    it is written back to in a copy of the menu (the original is kept for step 5)
     texts = []
-    paths = []
-
-    if menu.get("note"):
-        texts.append(menu["note"])
-        paths.append(("note",))
-
-    for mi, meal in enumerate(menu.get("meals", [])):
-        texts.append(meal.get("meal", ""))
-        paths.append(("meals", mi, "meal"))
-
-        for optKey in ("main", "alternative"):
-            opt = meal.get(optKey)
-
-            if not opt:
-                continue
-
-            texts.append(opt.get("meal_title", ""))
-            paths.append(("meals", mi, optKey, "meal_title"))
-
-            for ii, ing in enumerate(opt.get("ingredients", [])):
-                texts.append(ing.get("item", ""))
-                paths.append(("meals", mi, optKey, "ingredients", ii, "item"))
-                texts.append(ing.get("household_measure", ""))
-                paths.append(("meals", mi, optKey, "ingredients", ii, "household_measure"))
-
-        alternatives = meal.get("alternatives", [])
-
-        for ai, alt in enumerate(alternatives):
-            texts.append(alt.get("meal_title", ""))
-            paths.append(("meals", mi, "alternatives", ai, "meal_title"))
-
-            for ii, ing in enumerate(alt.get("ingredients", [])):
-                texts.append(ing.get("item", ""))
-                paths.append(("meals", mi, "alternatives", ai, "ingredients", ii, "item"))
-                texts.append(ing.get("household_measure", ""))
-                paths.append(
-                    ("meals", mi, "alternatives", ai, "ingredients", ii, "household_measure")
-                )
+    containers = []
+    keys = []
+    new_menu = _copy_schema_texts(menu, _MENU_TRANSLATION_SCHEMA, texts, containers, keys)
 
     # 2. For Hebrew: replace mapped phrases/words with placeholders, send to Azure, then restore
-    placeholder_map = []  # List of dicts: {ph: hebrew}
+    placeholder_map = []  # Per text: Hebrew terms indexed by placeholder number
     texts_for_azure = []
 
     if target == "he":
-        for i, t in enumerate(texts):
-            orig = t
-            ph_map = {}
-            ph_idx = 0
-
-            # Replace each mapped phrase/word with a unique placeholder (longest first)
-            def repl_func(match):
-                nonlocal ph_idx
-                en_word = match.group(0)
-                ph = f"__CUSTOMWORD{ph_idx}__"
-                ph_map[ph] = custom_map[en_word.lower()]
-                ph_idx += 1
-                return ph
-
-            for en_word in custom_words:
-                pattern = r"(?<!\w)" + re.escape(en_word) + r"(?!\w)"
-                t = re.sub(pattern, repl_func, t, flags=re.IGNORECASE)
-
-            placeholder_map.append(ph_map)
+        for t in texts:
+            # Replace each mapped phrase/word with a unique placeholder (longest first).
+            # Menus use the same food-term table as recipe translation.
+            t, ph_terms = _replace_custom_terms(t, _RECIPE_CUSTOM_MATCHER, _RECIPE_CUSTOM_MAP)
+            placeholder_map.append(ph_terms)
             texts_for_azure.append(t)
     else:
         texts_for_azure = texts
-        placeholder_map = [{} for _ in texts]
+        placeholder_map = [[] for _ in texts]
 
-    # 3. Call Azure Translator in bulk
-    endpoint = AZURE_TRANSLATOR_ENDPOINT
-    key = AZURE_TRANSLATOR_KEY
-    region = AZURE_TRANSLATOR_REGION
-
-    url = f"{endpoint}/translate?api-version=3.0&to={target}"
-    headers = {
-        "Ocp-Apim-Subscription-Key": key,
-        "Ocp-Apim-Subscription-Region": region,
-        "Content-Type": "application/json",
-    }
-
-    body = [{"Text": t} for t in texts_for_azure]
-    translations = []
-
-    if body:
-        resp = requests.post(url, headers=headers, json=body)
-        resp.raise_for_status()
-        translations = resp.json()  # a list, same length as body
-
-    # 4. Restore placeholders with Hebrew terms and preserve nutritional values
-    new_menu = deepcopy(menu)
+    # 3. Call Azure Translator in chunks within its per-request item/character limits
+    #    (a list, same length as texts_for_azure)
+    translations = _azure_translate_texts(texts_for_azure, target)
 
+    # 4. Restore placeholders with Hebrew terms and write each translation into the copy
     for idx, trans_item in enumerate(translations):
-        translated = trans_item["translations"][0]["text"]
-
-        # Replace placeholders with Hebrew
-        for ph, heb in placeholder_map[idx].items():
-            translated = translated.replace(ph, heb)
-
-        path = paths[idx]
-        obj = new_menu
-
-        for key in path[:-1]:
-            obj = obj[key]
-
-        obj[path[-1]] = translated
+        containers[idx][keys[idx]] = _restore_placeholders(
+            trans_item["translations"][0]["text"], placeholder_map[idx]
+        )
 
     # 5. Preserve original nutritional values and gram amounts after translation
     # This prevents nutritional values from changing during translation
-    if menu.get("meals"):
-        for mi, meal in enumerate(menu.get("meals", [])):
-            original_meal = menu["meals"][mi]
-            translated_meal = new_menu["meals"][mi]
-
-            # Preserve values for main and alternative options
-            for optKey in ("main", "alternative"):
-                if optKey in original_meal and optKey in translated_meal:
-                    original_opt = original_meal[optKey]
-                    translated_opt = translated_meal[optKey]
-
-                    if "ingredients" in original_opt and "ingredients" in translated_opt:
-                        for ii, original_ing in enumerate(original_opt["ingredients"]):
-                            if ii < len(translated_opt["ingredients"]):
-                                translated_ing = translated_opt["ingredients"][ii]
-
-                                # Preserve nutritional values and gram amounts
-                                nutritional_fields = [
-                                    "calories",
-                                    "protein",
-                                    "fat",
-                                    "carbs",
-                                    "portionSI(gram)",
-                                ]
-
-                                for field in nutritional_fields:
-                                    if field in original_ing:
-                                        translated_ing[field] = original_ing[field]
-
-                                # Preserve other important fields that shouldn't change
-                                preserve_fields = ["brand of pruduct", "UPC"]
-
-                                for field in preserve_fields:
-                                    if field in original_ing:
-                                        translated_ing[field] = original_ing[field]
-
-            # Preserve values for alternatives array if it exists
-            if "alternatives" in original_meal and "alternatives" in translated_meal:
-                for ai, original_alt in enumerate(original_meal["alternatives"]):
-                    if ai < len(translated_meal["alternatives"]):
-                        translated_alt = translated_meal["alternatives"][ai]
-
-                        if "ingredients" in original_alt and "ingredients" in translated_alt:
-                            for ii, original_ing in enumerate(original_alt["ingredients"]):
-                                if ii < len(translated_alt["ingredients"]):
-                                    translated_ing = translated_alt["ingredients"][ii]
-
-                                    # Preserve nutritional values and gram amounts
-                                    nutritional_fields = [
-                                        "calories",
-                                        "protein",
-                                        "fat",
-                                        "carbs",
-                                        "portionSI(gram)",
-                                    ]
-
-                                    for field in nutritional_fields:
-                                        if field in original_ing:
-                                            translated_ing[field] = original_ing[field]
-
-                                    # Preserve other important fields
-                                    preserve_fields = ["brand of pruduct", "UPC"]
-
-                                    for field in preserve_fields:
-                                        if field in original_ing:
-                                            translated_ing[field] = original_ing[field]
+    for original_meal, translated_meal in zip(menu.get("meals") or [], new_menu.get("meals") or []):
+        options = [
+            (original_meal.get(opt_key), translated_meal.get(opt_key))
+            for opt_key in ("main", "alternative")
+        ]
+        options.extend(
+            zip(original_meal.get("alternatives") or [], translated_meal.get("alternatives") or [])
+        )
+
+        for original_opt, translated_opt in options:
+            if isinstance(original_opt, dict) and isinstance(translated_opt, dict):
+                _preserve_ingredient_fields(
+                    original_opt.get("ingredients") or [], translated_opt.get("ingredients") or []
+                )
 
     # Clean ingredient names before returning
     cleaned_menu = clean_ingredient_names(new_menu)
@@ -1144,12 +1578,55 @@ def api_translate_menu():
     return jsonify(cleaned_menu)
 
 
+USER_PREFERENCES_CACHE_TTL = float(os.getenv("USER_PREFERENCES_CACHE_TTL", "60"))  # 0 disables
+USER_PREFERENCES_CACHE_SIZE = 2048
+_user_preferences_cache = OrderedDict()  # user_code -> (expires_at, preferences), LRU order
+_user_preferences_cache_lock = threading.Lock()
+
+
 def load_user_preferences(user_code=None):
     """
     Load user preferences from Supabase chat_users table.
 
     If user_code is not provided, falls back to first user or default values.
+    Results are cached per user_code for USER_PREFERENCES_CACHE_TTL seconds; the
+    returned dict is shared between callers and must not be mutated.
     """
+    now = time.monotonic()
+
+    with _user_preferences_cache_lock:
+        entry = _user_preferences_cache.get(user_code)
+        if entry and entry[0] > now:
+            _user_preferences_cache.move_to_end(user_code)
+            return entry[1]
+
+    preferences = _fetch_user_preferences(user_code)
+
+    if USER_PREFERENCES_CACHE_TTL > 0:
+        with _user_preferences_cache_lock:
+            _user_preferences_cache[user_code] = (now + USER_PREFERENCES_CACHE_TTL, preferences)
+            _user_preferences_cache.move_to_end(user_code)
+            if len(_user_preferences_cache) > USER_PREFERENCES_CACHE_SIZE:
+                _user_preferences_cache.popitem(last=False)
+
+    return preferences
+
+
+def invalidate_user_preferences(user_code=None):
+    """Drop cached preferences for a user_code so the next load reads Supabase."""
+    with _user_preferences_cache_lock:
+        _user_preferences_cache.pop(user_code, None)
+
+
+@app.after_request
+def _invalidate_preferences_after_chat_user_write(response):
+    # chat_users rows are edited through the supabase_api blueprint
+    if request.endpoint in ("supabase_api.update_chat_user", "supabase_api.delete_chat_user"):
+        invalidate_user_preferences((request.view_args or {}).get("user_code"))
+    return response
+
+
+def _fetch_user_preferences(user_code=None):
     try:
         # logger.info(f"🔍 Loading user preferences for user_code: {user_code}")
         # logger.info(f"Supabase URL: {supabase_url}")
@@ -1162,17 +1639,19 @@ def load_user_preferences(user_code=None):
             # Fetch specific user by user_code
             # logger.info(f"Fetching user with user_code: {user_code}")
 
+            # maybe_single() returns the row object itself, or None when there is no match
             response = (
                 supabase.table("chat_users")
                 .select(selected_fields)
                 .eq("user_code", user_code)
+                .maybe_single()
                 .execute()
             )
 
             # logger.info(f"Supabase response: {response}")
 
-            if response.data:
-                user_data = response.data[0]
+            if response and response.data:
+                user_data = response.data
                 # logger.info(f"Found user: {user_data.get('user_code')}")
             else:
                 logger.warning(f"No user found with user_code: {user_code}")
@@ -1181,12 +1660,18 @@ def load_user_preferences(user_code=None):
             # Fallback: get first user or use default values
             logger.info("No user_code provided, fetching first user")
 
-            response = supabase.table("chat_users").select(selected_fields).limit(1).execute()
+            response = (
+                supabase.table("chat_users")
+                .select(selected_fields)
+                .limit(1)
+                .maybe_single()
+                .execute()
+            )
 
             logger.info(f"Fallback supabase response: {response}")
 
-            if response.data:
-                user_data = response.data[0]
+            if response and response.data:
+                user_data = response.data
                 logger.info(f"Using fallback user: {user_data.get('user_code')}")
             else:
                 logger.warning("No users found in chat_users table, using default values")
@@ -1318,14 +1803,70 @@ def load_user_preferences(user_code=None):
 
 # Azure OpenAI config (Main AI for meal generation)
 
-client = AzureOpenAI(
-    api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_API_BASE,
-    api_key=AZURE_OPENAI_API_KEY,
-)
+OPENAI_MAX_CONNECTIONS = 64
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 32
+OPENAI_KEEPALIVE_EXPIRY = 60  # Seconds an idle TLS connection is kept for reuse
+
+
+@lru_cache(maxsize=None)
+def _openai_client():
+    """Azure OpenAI client, created (and the SDK imported) on first use rather than at import."""
+    import httpx
+    from openai import AzureOpenAI
+
+    # Sized for the concurrent template/menu fan-outs so they reuse warm connections
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        follow_redirects=True,
+    )
+    return AzureOpenAI(
+        api_version=AZURE_OPENAI_API_VERSION,
+        azure_endpoint=AZURE_OPENAI_API_BASE,
+        api_key=AZURE_OPENAI_API_KEY,
+        http_client=http_client,
+    )
+
 
 deployment = AZURE_OPENAI_DEPLOYMENT
 
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _stream_json_completion(**kwargs):
+    """
+    Stream a chat completion and stop reading as soon as the first complete JSON object has
+    arrived, so trailing whitespace or filler isn't waited for. Returns the object's text
+    (or the whole response when no complete object was found).
+    """
+    stream = _openai_client().chat.completions.create(stream=True, **kwargs)
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:  # Azure sends prompt-filter results in a choiceless chunk
+                continue
+            piece = chunk.choices[0].delta.content
+            if not piece:
+                continue
+            parts.append(piece)
+            if "}" not in piece:
+                continue
+            text = "".join(parts)
+            start = text.find("{")
+            if start < 0:
+                continue
+            try:
+                _, end = _JSON_DECODER.raw_decode(text, start)
+            except ValueError:
+                continue
+            return text[start:end]
+        return "".join(parts)
+    finally:
+        stream.close()
+
 # ⚠️ IMPORTANT: MODEL USAGE CONFIGURATION
 # - OBI2 (default) is used for ALL operations EXCEPT template generation
 # - Template generator (/api/template) uses the same 'deployment' variable above
@@ -1383,6 +1924,10 @@ Return **ONLY** the corrected JSON for `"meal"`—no markdown, no comments, no e
 
 """
 
+# Built once: an identical leading system message keeps the prompt prefix eligible for
+# Azure OpenAI's automatic prompt caching across calls and retries
+_NUTRITION_CORRECTION_SYSTEM_MESSAGE = {"role": "system", "content": NUTRITION_CORRECTION_PROMPT}
+
 
 def _correct_meal_nutrition(meal_data: dict, macro_targets: dict, max_attempts: int = 1):
     """
@@ -1398,6 +1943,12 @@ def _correct_meal_nutrition(meal_data: dict, macro_targets: dict, max_attempts:
         logger.info(f"📊 Current meal totals: {meal_data.get('totals', 'not calculated')}")
         logger.info(f"🎯 Target macros: {macro_targets}")
 
+        # The payload is the same on every attempt; build the messages once
+        messages = [
+            _NUTRITION_CORRECTION_SYSTEM_MESSAGE,
+            {"role": "user", "content": _json_dumps(payload)},
+        ]
+
         for attempt in range(1, max_attempts + 1):
             try:
                 logger.info(
@@ -1407,16 +1958,10 @@ def _correct_meal_nutrition(meal_data: dict, macro_targets: dict, max_attempts:
                     f"🔧 Sending to OBI2 - Meal: {meal_data.get('meal_title', 'N/A')}, Targets: {macro_targets}"
                 )
 
-                # Build the full content to send
-                full_content = f"{NUTRITION_CORRECTION_PROMPT}\n\nInput:\n{json.dumps(payload, ensure_ascii=False)}"
-
                 # Call OBI2 (Azure OpenAI)
-                response = client.chat.completions.create(
+                response = _openai_client().chat.completions.create(
                     model=deployment,
-                    messages=[
-                        {"role": "system", "content": NUTRITION_CORRECTION_PROMPT},
-                        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
-                    ],
+                    messages=messages,
                     max_tokens=2048,
                     temperature=0.3,
                 )
@@ -1438,7 +1983,7 @@ def _correct_meal_nutrition(meal_data: dict, macro_targets: dict, max_attempts:
                 logger.info(f"🔍 After stripping markdown: {raw[:8000]}...")
 
                 try:
-                    corrected_meal = json.loads(raw)
+                    corrected_meal = _json_loads(raw)
                 except Exception as e:
                     logger.warning(f"❌ JSON parse error in correction (attempt {attempt}): {e}")
                     if attempt < max_attempts:
@@ -1499,6 +2044,25 @@ def require_api_key(f):
     return decorated_function
 
 
+_MACRO_NUMBER_RE = re.compile(r"[-+]?\d*\.?\d+")
+
+
+def _parse_macro(value):
+    """Parse a macro target such as 150, 150.0, "150g" or "150 grams" into grams (0.0 if unparseable)."""
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return 0.0
+    try:
+        return float(value.rstrip("gG ").strip())
+    except ValueError:
+        # Free-form units ("150 grams", "~150g/day"): take the first number
+        match = _MACRO_NUMBER_RE.search(value)
+        return float(match.group()) if match else 0.0
+
+
 def _calculate_macros_from_calories(calories, calories_pct, daily_calories, daily_protein, daily_fat):
     """
     Calculate macros for a meal based on calories percentage (Python-based calculation).
@@ -1524,11 +2088,8 @@ def _calculate_macros_from_calories(calories, calories_pct, daily_calories, dail
     # Calculate carbs from remaining calories
     # Formula: calories = (protein * 4) + (fat * 9) + (carbs * 4)
     # So: carbs = (calories - (protein * 4) - (fat * 9)) / 4
-    carbs = (calories - (protein * 4) - (fat * 9)) / 4.0
-    
-    # Ensure carbs is not negative
-    if carbs < 0:
-        carbs = 0
+    # Clamped so carbs is never negative
+    carbs = max((calories - (protein * 4) - (fat * 9)) / 4.0, 0)
     
     return {
         "calories": round(calories, 1),
@@ -1538,105 +2099,423 @@ def _calculate_macros_from_calories(calories, calories_pct, daily_calories, dail
     }
 
 
-@app.route("/api/template", methods=["POST"])
-def api_template():
+# Region-specific cuisine guidance for the template prompts
+_REGION_INSTRUCTIONS = MappingProxyType({
+    "israel": "Focus on Israeli cuisine and products. Use Israeli brands (Tnuva, Osem, Strauss, Elite, Telma) and local foods (hummus, falafel, tahini, pita, sabich, shakshuka).",
+    "us": "Focus on American cuisine and products. Use American brands (Kraft, General Mills, Kellogg's, Pepsi) and typical American foods (bagels, cereals, sandwiches, burgers, mac and cheese).",
+    "uk": "Focus on British cuisine and products. Use British brands (Tesco, Sainsbury's, Heinz UK, Cadbury) and typical British foods (beans on toast, fish and chips, bangers and mash).",
+    "canada": "Focus on Canadian cuisine and products. Use Canadian brands (Loblaws, President's Choice, Tim Hortons) and typical Canadian foods (maple syrup dishes, poutine elements).",
+    "australia": "Focus on Australian cuisine and products. Use Australian brands (Woolworths, Coles, Arnott's, Vegemite) and typical Australian foods.",
+})
+
+_PROTEIN_KEYWORDS = (
+    "chicken", "beef", "steak", "turkey", "fish", "salmon", "tuna",
+    "eggs", "egg", "tofu", "cottage cheese", "cheese", "yogurt",
+    "lentils", "beans", "quinoa", "meat", "poultry", "hummus", "falafel",
+)
+# Longest keyword first so "cottage cheese" wins over "cheese" and "eggs" over "egg"
+_PROTEIN_KEYWORDS_RE = re.compile(
+    r"\b(" + "|".join(map(re.escape, sorted(_PROTEIN_KEYWORDS, key=len, reverse=True))) + r")"
+)
+
+# Deterministic alternatives keyed by meal slot, then by the main meal's protein source. Each
+# entry differs from the key in protein, carb base and preparation, so no LLM call is needed
+# for common mains. "light" covers breakfasts and snacks, "plate" lunches and dinners; meals
+# of any other type go to the model. Only used when the client has no allergies or
+# limitations to reason about.
+_DAIRY_PLATE_ALTERNATIVES = (
+    ("Grilled Chicken with Rice and Vegetables", "chicken"),
+    ("Baked Salmon with Potatoes and Green Beans", "salmon"),
+    ("Lentil Curry with Basmati Rice", "lentils"),
+    ("Turkey Meatballs with Whole Wheat Pasta", "turkey"),
+)
+TEMPLATE_ALTERNATIVES = MappingProxyType({
+    "light": MappingProxyType({
+        "eggs": (
+            ("Greek Yogurt Parfait with Granola and Berries", "yogurt"),
+            ("Cottage Cheese on Whole Wheat Toast with Vegetables", "cottage cheese"),
+            ("Tuna Salad on Whole Grain Crackers", "tuna"),
+            ("Hummus Toast with Cucumber and Tomato", "chickpeas"),
+        ),
+        "yogurt": (
+            ("Shakshuka with Whole Wheat Bread", "eggs"),
+            ("Vegetable Omelette with Whole Wheat Toast", "eggs"),
+            ("Cottage Cheese with Rice Cakes and Cucumber", "cottage cheese"),
+            ("Scrambled Tofu on Rye Toast", "tofu"),
+            ("Smoked Salmon Bagel", "salmon"),
+        ),
+        "cottage cheese": (
+            ("Vegetable Omelette with Whole Wheat Toast", "eggs"),
+            ("Yogurt with Oats and Fresh Fruit", "yogurt"),
+            ("Tuna Sandwich on Whole Grain Bread", "tuna"),
+            ("Hummus Toast with Roasted Vegetables", "chickpeas"),
+        ),
+        "cheese": (
+            ("Poached Eggs on Sourdough Toast", "eggs"),
+            ("Yogurt Bowl with Muesli and Banana", "yogurt"),
+            ("Turkey Breast Sandwich with Vegetables", "turkey"),
+            ("Scrambled Tofu with Whole Grain Toast", "tofu"),
+        ),
+        "chicken": (
+            ("Egg Salad Sandwich on Rye Bread", "eggs"),
+            ("Tuna Salad on Whole Grain Crackers", "tuna"),
+            ("Greek Yogurt with Granola and Fruit", "yogurt"),
+        ),
+        "turkey": (
+            ("Egg Salad Sandwich on Rye Bread", "eggs"),
+            ("Cottage Cheese with Rice Cakes and Cucumber", "cottage cheese"),
+            ("Tuna Salad on Whole Grain Crackers", "tuna"),
+        ),
+        "salmon": (
+            ("Vegetable Omelette with Whole Wheat Toast", "eggs"),
+            ("Greek Yogurt Parfait with Granola and Berries", "yogurt"),
+            ("Turkey Breast Sandwich with Vegetables", "turkey"),
+        ),
+        "tuna": (
+            ("Egg Salad Sandwich on Rye Bread", "eggs"),
+            ("Cottage Cheese with Rice Cakes and Cucumber", "cottage cheese"),
+            ("Hummus with Pita and Vegetable Sticks", "chickpeas"),
+            ("Turkey Breast Sandwich with Vegetables", "turkey"),
+        ),
+        "tofu": (
+            ("Vegetable Omelette with Whole Wheat Toast", "eggs"),
+            ("Greek Yogurt with Oats and Berries", "yogurt"),
+            ("Cottage Cheese on Rye Toast", "cottage cheese"),
+        ),
+        "chickpeas": (
+            ("Greek Yogurt with Granola and Fruit", "yogurt"),
+            ("Egg Salad Sandwich on Rye Bread", "eggs"),
+            ("Tuna Salad on Whole Grain Crackers", "tuna"),
+        ),
+    }),
+    "plate": MappingProxyType({
+        "eggs": (
+            ("Grilled Chicken Salad with Quinoa", "chicken"),
+            ("Baked Fish with Potatoes and Salad", "fish"),
+            ("Lentil Soup with Whole Grain Bread", "lentils"),
+            ("Beef Stir-Fry with Rice and Vegetables", "beef"),
+        ),
+        "yogurt": _DAIRY_PLATE_ALTERNATIVES,
+        "cottage cheese": _DAIRY_PLATE_ALTERNATIVES,
+        "cheese": _DAIRY_PLATE_ALTERNATIVES,
+        "chicken": (
+            ("Baked Salmon with Sweet Potato and Green Beans", "salmon"),
+            ("Lentil Stew with Brown Rice", "lentils"),
+            ("Beef Stir-Fry with Noodles and Vegetables", "beef"),
+            ("Tofu and Vegetable Curry with Quinoa", "tofu"),
+        ),
+        "turkey": (
+            ("Grilled Fish with Couscous and Salad", "fish"),
+            ("Chickpea and Vegetable Stew with Bulgur", "chickpeas"),
+            ("Beef Kebabs with Baked Potatoes", "beef"),
+            ("Egg Fried Rice with Vegetables", "eggs"),
+        ),
+        "beef": (
+            ("Roasted Chicken with Quinoa and Vegetables", "chicken"),
+            ("Baked Salmon with Rice and Broccoli", "salmon"),
+            ("Black Bean Chili with Corn Tortillas", "beans"),
+            ("Turkey Meatballs with Whole Wheat Pasta", "turkey"),
+        ),
+        "fish": (
+            ("Chicken Shawarma with Pita and Salad", "chicken"),
+            ("Roasted Chicken with Rice and Vegetables", "chicken"),
+            ("Lentil Soup with Whole Grain Bread", "lentils"),
+            ("Beef Goulash with Potatoes", "beef"),
+            ("Tofu Noodle Bowl with Vegetables", "tofu"),
+        ),
+        "salmon": (
+            ("Grilled Chicken with Bulgur and Roasted Vegetables", "chicken"),
+            ("Turkey Stir-Fry with Rice Noodles", "turkey"),
+            ("Bean and Vegetable Stew with Couscous", "beans"),
+            ("Beef Kofta with Baked Potatoes", "beef"),
+            ("Beef Meatballs with Mashed Potatoes", "beef"),
+        ),
+        "tuna": (
+            ("Chicken Wrap with Vegetables", "chicken"),
+            ("Lentil Salad with Brown Rice", "lentils"),
+            ("Hummus Bowl with Pita and Vegetables", "chickpeas"),
+            ("Beef Stir-Fry with Noodles", "beef"),
+        ),
+        "tofu": (
+            ("Grilled Chicken with Rice and Vegetables", "chicken"),
+            ("Baked Fish with Potatoes and Salad", "fish"),
+            ("Lentil Curry with Basmati Rice", "lentils"),
+            ("Omelette with Whole Wheat Toast and Salad", "eggs"),
+        ),
+        "lentils": (
+            ("Grilled Chicken with Couscous and Salad", "chicken"),
+            ("Baked Salmon with Potatoes", "salmon"),
+            ("Tofu Stir-Fry with Rice", "tofu"),
+            ("Turkey Burger with Sweet Potato Wedges", "turkey"),
+        ),
+        "beans": (
+            ("Chicken Breast with Rice and Vegetables", "chicken"),
+            ("Baked Fish with Quinoa", "fish"),
+            ("Egg and Vegetable Frittata with Toast", "eggs"),
+            ("Beef Stir-Fry with Noodles", "beef"),
+        ),
+        "chickpeas": (
+            ("Grilled Chicken with Rice and Salad", "chicken"),
+            ("Baked Fish with Bulgur and Vegetables", "fish"),
+            ("Omelette with Whole Wheat Pita", "eggs"),
+            ("Beef Meatballs with Mashed Potatoes", "beef"),
+        ),
+    }),
+})
+# Dishes that only fit the Israeli region prompt (also the default for unknown regions)
+_ISRAELI_TEMPLATE_DISHES = frozenset((
+    "Shakshuka with Whole Wheat Bread",
+    "Hummus Toast with Cucumber and Tomato",
+    "Hummus Toast with Roasted Vegetables",
+    "Hummus with Pita and Vegetable Sticks",
+    "Chicken Shawarma with Pita and Salad",
+    "Beef Kofta with Baked Potatoes",
+    "Hummus Bowl with Pita and Vegetables",
+    "Omelette with Whole Wheat Pita",
+))
+_TEMPLATE_ALTERNATIVE_ALIASES = MappingProxyType({
+    "egg": "eggs", "steak": "beef", "meat": "beef", "poultry": "chicken",
+    "hummus": "chickpeas", "falafel": "chickpeas",
+})
+
+
+def _meal_slot(meal_name):
+    """Alternatives-table slot: "light" for breakfasts and snacks, "plate" for lunches and dinners."""
+    name = (meal_name or "").lower()
+    if any(word in name for word in ("breakfast", "brunch", "snack")):
+        return "light"
+    if any(word in name for word in ("lunch", "dinner", "supper")):
+        return "plate"
+    return None
+
+
+def _table_alternative(main_protein_source, meal_name, region, offset, seen):
     """
-    New template generation approach:
-    1. Get meal plan structure
-    2. Generate meal names (main and alternative) using AI
-    3. Calculate macros using Python (like DSPy)
-    4. Return template JSON
+    Pick an alternative from TEMPLATE_ALTERNATIVES for the meal's slot and the client's
+    region, or None when nothing fits (the model names it instead).
     """
+    slot = _meal_slot(meal_name)
+    if slot is None:
+        return None
+    table = TEMPLATE_ALTERNATIVES[slot]
+    key = (main_protein_source or "").strip().lower()
+    if key not in table:
+        key = _guess_protein_source(key)
+        key = _TEMPLATE_ALTERNATIVE_ALIASES.get(key, key)
+    candidates = table.get(key)
+    if not candidates:
+        return None
+    israeli = region == "israel" or region not in _REGION_INSTRUCTIONS
+    for i in range(len(candidates)):
+        name, protein = candidates[(offset + i) % len(candidates)]
+        if name.lower() in seen or (not israeli and name in _ISRAELI_TEMPLATE_DISHES):
+            continue
+        return name, protein
+    return None
+    for i in range(len(candidates)):
+        name, protein = candidates[(offset + i) % len(candidates)]
+        if name.lower() not in seen:
+            return name, protein
+    return None
+
+
+if AHOCORASICK_AVAILABLE:
+    _PROTEIN_AUTOMATON = ahocorasick.Automaton()
+    for _keyword in _PROTEIN_KEYWORDS:
+        _PROTEIN_AUTOMATON.add_word(_keyword, _keyword)
+    _PROTEIN_AUTOMATON.make_automaton()
+    del _keyword
+else:
+    _PROTEIN_AUTOMATON = None
+
+
+def _is_plain_english(description):
+    """Short ASCII descriptions are already English meal names and need no translation."""
+    return description.isascii() and len(description.split()) <= 8
+
+
+def _guess_protein_source(description):
+    """Best-effort protein source for a meal description the translator didn't cover."""
+    text = description.lower()
+    if _PROTEIN_AUTOMATON is None:
+        match = _PROTEIN_KEYWORDS_RE.search(text)
+        return match.group(1) if match else "protein"
+
+    # Leftmost keyword that starts a word, longest on ties, same as _PROTEIN_KEYWORDS_RE
+    best_start, best = len(text), None
+    for end, keyword in _PROTEIN_AUTOMATON.iter(text):
+        start = end - len(keyword) + 1
+        if start > best_start or (start > 0 and _is_word_char(text[start - 1])):
+            continue
+        if start < best_start or len(keyword) > len(best):
+            best_start, best = start, keyword
+    return best or "protein"
+
+
+TEMPLATE_NAME_CACHE_SIZE = 4096
+TEMPLATE_PROMPT_ALTERNATIVES = 10  # Most recent alternatives listed in prompts as names to avoid
+# (description, meal_type, region, allergies, limitations) -> (main_name, protein), LRU order.
+# The client's region and constraints are in the naming prompt, so they are part of the key.
+_template_translations = OrderedDict()
+_template_translations_lock = threading.Lock()
+
+
+def _template_translation_key(description, meal_name, scope):
+    """_template_translations key; scope is the plan's (region, allergies, limitations)."""
+    region, allergies, limitations = scope
+    return (description, meal_name, region, tuple(allergies), tuple(limitations))
+
+
+def _generate_alternative_name(alt_system_prompt, meal_name, macros_calculated,
+                               main_meal_name, main_protein_source, generated_alternatives):
+    """Ask the model for an alternative to one template meal; returns (name, protein_source)."""
+    alt_prompt = f"""Generate a DIFFERENT alternative meal for this specific main dish:
+
+**MAIN DISH:** {main_meal_name}
+**MAIN PROTEIN SOURCE:** {main_protein_source}
+
+**MEAL DETAILS:**
+- Meal Type: {meal_name}
+- Calories: {macros_calculated['calories']} kcal
+- Protein: {macros_calculated['protein']}g
+- Fat: {macros_calculated['fat']}g
+- Carbs: {macros_calculated['carbs']}g
+
+**PREVIOUSLY GENERATED ALTERNATIVES (MUST AVOID DUPLICATES):**
+{chr(10).join([f"- {alt}" for alt in generated_alternatives]) if generated_alternatives else "None yet"}
+
+**REQUIREMENTS:**
+- Generate a COMPLETELY DIFFERENT meal from the main dish "{main_meal_name}"
+- Must differ in: protein source, carb base, cooking method, and flavour profile
+- Must be UNIQUE - not the same as any previously generated alternative listed above
+- Return ONLY a JSON object with: {{"alternative_name": "<English meal name>", "alternative_protein_source": "<protein source>"}}"""
+
+    alt_result_text = _stream_json_completion(
+        model=deployment,
+        messages=[
+            {"role": "system", "content": alt_system_prompt},
+            {"role": "user", "content": alt_prompt}
+        ],
+        max_tokens=100,
+        temperature=0.8,  # Higher temperature for more variety
+        response_format={"type": "json_object"},
+    )
+    logger.info(f"✅ AI response for alternative '{meal_name}': {alt_result_text}")
+
     try:
-        data = request.get_json()
-        user_code = data.get("user_code") if data else None
+        alt_data = _json_loads(_strip_markdown_fences(alt_result_text))
+    except json.JSONDecodeError:
+        logger.error(f"❌ Failed to parse AI response for '{meal_name}'. Raw response: {alt_result_text}")
+        raise
+    alt_meal_name = alt_data.get("alternative_name", f"{meal_name} Alternative")
+    alt_protein_source = alt_data.get("alternative_protein_source", "protein")
+
+    logger.info(f"✅ Generated alternative meal name: {alt_meal_name}")
+    return alt_meal_name, alt_protein_source
+
+
+@lru_cache(maxsize=TEMPLATE_NAME_CACHE_SIZE)
+def _cached_alternative_name(alt_system_prompt, meal_name, macro_items, main_meal_name, main_protein_source):
+    """Memoised first-pass alternative; the system prompt carries region, allergies and limitations."""
+    return _generate_alternative_name(
+        alt_system_prompt, meal_name, dict(macro_items), main_meal_name, main_protein_source, ()
+    )
 
-        # Get meal plan structure
-        meal_structure = data.get("meal_structure") or data.get("meal_plan_structure")
 
-        # If not provided in request, load from preferences
-        if not meal_structure:
-            preferences = load_user_preferences(user_code)
-            meal_structure = preferences.get("meal_plan_structure", [])
-        
-        if not meal_structure or len(meal_structure) == 0:
-            return jsonify({"error": "No meal plan structure provided"}), 400
-        
-        # Load user preferences for macro targets
-        preferences = load_user_preferences(user_code)
-        
-        # Get daily macro targets
-        def parse_macro(value):
-            if value is None:
-                return 0.0
-            try:
-                return float(str(value).replace("g", "").strip())
-            except (ValueError, TypeError):
-                return 0.0
-        
-        daily_calories = preferences.get("calories_per_day", 2000)
-        if daily_calories is None:
-            daily_calories = 2000
-        
-        macros = preferences.get("macros", {})
-        if not macros:
-            macros = {"protein": "150g", "fat": "80g"}
-        
-        daily_protein = parse_macro(macros.get("protein", "150g"))
-        daily_fat = parse_macro(macros.get("fat", "80g"))
-        
-        # Get region and constraints for AI
-        region = preferences.get("region", "israel").lower()
-        allergies = preferences.get("allergies", []) or []
-        limitations = preferences.get("limitations", []) or []
-        
-        allergies_list = ", ".join(allergies) if allergies else "None"
-        limitations_list = ", ".join(limitations) if limitations else "None"
-        
-        # Region-specific instructions
-        region_instructions = {
-            "israel": "Focus on Israeli cuisine and products. Use Israeli brands (Tnuva, Osem, Strauss, Elite, Telma) and local foods (hummus, falafel, tahini, pita, sabich, shakshuka).",
-            "us": "Focus on American cuisine and products. Use American brands (Kraft, General Mills, Kellogg's, Pepsi) and typical American foods (bagels, cereals, sandwiches, burgers, mac and cheese).",
-            "uk": "Focus on British cuisine and products. Use British brands (Tesco, Sainsbury's, Heinz UK, Cadbury) and typical British foods (beans on toast, fish and chips, bangers and mash).",
-            "canada": "Focus on Canadian cuisine and products. Use Canadian brands (Loblaws, President's Choice, Tim Hortons) and typical Canadian foods (maple syrup dishes, poutine elements).",
-            "australia": "Focus on Australian cuisine and products. Use Australian brands (Woolworths, Coles, Arnott's, Vegemite) and typical Australian foods.",
-        }
-        region_instruction = region_instructions.get(region, region_instructions["israel"])
-        
-        # Build system prompt for translating main meal description to English
-        translate_prompt = f"""You are a translator and nutritionist. Translate meal descriptions to proper English meal names.
+def _plan_template(user_code, meal_structure):
+    """
+    Work out a template's meals, targets and prompts, and settle every name that needs no
+    model call. The returned plan's "pending" list is what the naming call still has to cover.
+    """
+    # Load user preferences for macro targets
+    preferences = load_user_preferences(user_code)
+    
+    # Get daily macro targets
+    daily_calories = preferences.get("calories_per_day", 2000)
+    if daily_calories is None:
+        daily_calories = 2000
+    
+    macros = preferences.get("macros", {})
+    if not macros:
+        macros = {"protein": "150g", "fat": "80g"}
+    
+    daily_protein = _parse_macro(macros.get("protein", "150g"))
+    daily_fat = _parse_macro(macros.get("fat", "80g"))
+    
+    # Get region and constraints for AI
+    region = preferences.get("region", "israel").lower()
+    allergies = preferences.get("allergies", []) or []
+    limitations = preferences.get("limitations", []) or []
+    
+    allergies_list = ", ".join(allergies) if allergies else "None"
+    limitations_list = ", ".join(limitations) if limitations else "None"
+    
+    region_instruction = _REGION_INSTRUCTIONS.get(region, _REGION_INSTRUCTIONS["israel"])
+    # Cached translations are only shared between clients with the same prompt constraints
+    translation_scope = (
+        region,
+        tuple(sorted(str(a).lower().strip() for a in allergies)),
+        tuple(sorted(str(lim).lower().strip() for lim in limitations)),
+    )
+    
+    # Build system prompt for naming the main dish and its alternative in one call.
+    # Per-client text goes last so the fixed rules form a cacheable prompt prefix.
+    template_prompt = f"""You are a translator and expert nutritionist naming the main and alternative meals of a meal plan.
 
 **CRITICAL: ALL OUTPUT MUST BE IN ENGLISH ONLY**
-• Translate Hebrew/Arabic descriptions to English
+• All meal names and protein sources MUST be in English
+• NEVER use Hebrew, Arabic, or any other language
+
+**MAIN MEAL RULES:**
+• If a meal has a "description", translate it (Hebrew/Arabic → English) into a proper, appetizing English meal name
 • Preserve the client's food preferences and intent
-• Make it a proper, appetizing meal name in English
 • Example: "סלט עם ביצים קשות" → "Hard Boiled Eggs with Mixed Salad"
 • Example: "yogurt with granola" → "Yogurt with Granola and Fresh Berries"
 • Example: "meatballs with rice" → "Beef Meatballs with Rice and Tomato Sauce"
+• If a meal already has a "main_name", return it unchanged as the main meal
+
+**ALTERNATIVE MEAL RULES:**
+• Alternative meal must differ from main meal in:
+  1. Protein source (different protein)
+  2. Carb base (different carb source)
+  3. Cooking method (different preparation)
+  4. Flavour profile (different cuisine style)
+• Never repeat the same core ingredient in both options
+• Must be UNIQUE - not the same as any other alternative in the plan or any previously generated alternative
 
 **OUTPUT FORMAT:**
 Return ONLY valid JSON - no markdown, no commentary.
 
+You will receive a JSON list of meals, each with an "idx", a "meal_type", its macros and either a "description" or a "main_name".
+Return one entry per meal, echoing its "idx".
+
 Schema:
 {{
-  "main_name": "<English meal name>",
-  "main_protein_source": "<protein source in English>"
-}}"""
-        
-        # Build system prompt for alternative meal generation only
-        alt_system_prompt = f"""You are an expert nutritionist generating alternative meal names for a meal plan.
+  "meals": [
+    {{
+      "idx": <idx of the meal>,
+      "main_name": "<English meal name>",
+      "main_protein_source": "<protein source in English>",
+      "alternative_name": "<English dish name for alternative option>",
+      "alternative_protein_source": "<English protein name for alternative>"
+    }}
+  ]
+}}
+
+**REGION:** {region_instruction}
+
+**DIETARY CONSTRAINTS:**
+• ALLERGIES (LIFE THREATENING - ZERO TOLERANCE): {allergies_list}
+• DIETARY LIMITATIONS: {limitations_list}"""
+    
+    # Build system prompt for generating a single alternative (fallback and duplicate repair)
+    alt_system_prompt = f"""You are an expert nutritionist generating alternative meal names for a meal plan.
 
 **CRITICAL: ALL OUTPUT MUST BE IN ENGLISH ONLY**
 • All meal names MUST be in English (e.g., "Scrambled Eggs with Toast", "Grilled Chicken Salad")
 • All protein sources MUST be in English (e.g., "eggs", "chicken", "yogurt", "salmon")
 • NEVER use Hebrew, Arabic, or any other language
 
-{region_instruction}
-
-**DIETARY CONSTRAINTS:**
-• ALLERGIES (LIFE THREATENING - ZERO TOLERANCE): {allergies_list}
-• DIETARY LIMITATIONS: {limitations_list}
-
 **ALTERNATIVE MEAL RULES:**
 • Alternative meal must differ from main meal in:
   1. Protein source (different protein)
@@ -1653,203 +2532,507 @@ Schema:
 {{
   "alternative_name": "<English dish name for alternative option>",
   "alternative_protein_source": "<English protein name for alternative>"
-}}"""
+}}
+
+**REGION:** {region_instruction}
+
+**DIETARY CONSTRAINTS:**
+• ALLERGIES (LIFE THREATENING - ZERO TOLERANCE): {allergies_list}
+• DIETARY LIMITATIONS: {limitations_list}"""
+    
+    kept = []  # (meal_name, description, macros) per meal with a calorie share
+    for meal_data in meal_structure:
+        meal_name = meal_data.get("meal", "Unnamed Meal")
+        calories_pct = meal_data.get("calories_pct", 0)
         
-        template = []
-        generated_alternatives = []  # Track all generated alternatives to avoid duplicates
+        if calories_pct == 0:
+            logger.warning(f"⚠️ Meal '{meal_name}' has 0% calories, skipping")
+            continue
         
-        # Process each meal in the structure
-        for meal_data in meal_structure:
-            meal_name = meal_data.get("meal", "Unnamed Meal")
-            calories_pct = meal_data.get("calories_pct", 0)
-            description = meal_data.get("description", "")
-            
-            if calories_pct == 0:
-                logger.warning(f"⚠️ Meal '{meal_name}' has 0% calories, skipping")
-                continue
-            
-            # Calculate macros using Python
-            macros_calculated = _calculate_macros_from_calories(
-                calories=None,  # Will be calculated from calories_pct
-                calories_pct=calories_pct,
-                daily_calories=daily_calories,
-                daily_protein=daily_protein,
-                daily_fat=daily_fat
-            )
-            
-            # STEP 1: Translate main meal description to English
-            main_meal_name = None
-            main_protein_source = None
-            
-            if description:
-                try:
-                    translate_user_prompt = f"""Translate this meal description to a proper English meal name:
-
-**DESCRIPTION:** {description}
-
-**MEAL TYPE:** {meal_name}
-
-Return a proper, appetizing English meal name that preserves the client's food preferences."""
-                    
-                    translate_response = client.chat.completions.create(
-                        model=deployment,
-                        messages=[
-                            {"role": "system", "content": translate_prompt},
-                            {"role": "user", "content": translate_user_prompt}
-                        ],
-                        max_tokens=150,
-                        temperature=0.3
-                    )
-                    
-                    translate_result = translate_response.choices[0].message.content
-                    cleaned_translate = _strip_markdown_fences(translate_result)
-                    translate_data = json.loads(cleaned_translate)
-                    main_meal_name = translate_data.get("main_name", description)
-                    main_protein_source = translate_data.get("main_protein_source", "protein")
-                    
-                    logger.info(f"✅ Translated main meal: '{description}' → '{main_meal_name}'")
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to translate description, using as-is: {e}")
-                    main_meal_name = description
-                    # Extract protein source from name
-                    name_lower = description.lower()
-                    proteins = [
-                        "chicken", "beef", "steak", "turkey", "fish", "salmon", "tuna",
-                        "eggs", "egg", "tofu", "cottage cheese", "cheese", "yogurt",
-                        "lentils", "beans", "quinoa", "meat", "poultry", "hummus", "falafel"
-                    ]
-                    main_protein_source = "protein"
-                    for protein in proteins:
-                        if protein in name_lower:
-                            main_protein_source = protein
-                            break
+        # Calculate macros using Python
+        macros_calculated = _calculate_macros_from_calories(
+            calories=None,  # Will be calculated from calories_pct
+            calories_pct=calories_pct,
+            daily_calories=daily_calories,
+            daily_protein=daily_protein,
+            daily_fat=daily_fat
+        )
+        kept.append((meal_name, meal_data.get("description", ""), macros_calculated))
+    
+    # STEP 1: Main meal names that need no model call (no description, already English,
+    # or translated before)
+    mains = [None] * len(kept)
+    with _template_translations_lock:
+        for i, (meal_name, description, _) in enumerate(kept):
+            if not description:
+                mains[i] = (f"{meal_name} Main", "protein")
+            elif _is_plain_english(description):
+                name = " ".join(word[:1].upper() + word[1:] for word in description.split())
+                mains[i] = (name, _guess_protein_source(description))
             else:
-                main_meal_name = f"{meal_name} Main"
-                main_protein_source = "protein"
-            
-            # STEP 2: Generate alternative meal using AI based on main meal
-            alt_result_text = None
-            alt_meal_name = None
-            alt_protein_source = None
-            
-            try:
-                alt_prompt = f"""Generate a DIFFERENT alternative meal for this specific main dish:
+                key = _template_translation_key(description, meal_name, translation_scope)
+                if key in _template_translations:
+                    _template_translations.move_to_end(key)
+                    mains[i] = _template_translations[key]
+    
+    # STEP 2: Take alternatives from the local table where possible; without allergies or
+    # limitations there is nothing for the model to reason about for a known protein in a
+    # known meal slot
+    alternatives = [None] * len(kept)
+    if not allergies and not limitations:
+        offset = sum(map(ord, user_code or ""))  # Rotates the table per client
+        table_seen = set()
+        for i, main in enumerate(mains):
+            if main:
+                alternatives[i] = _table_alternative(main[1], kept[i][0], region, offset + i, table_seen)
+                if alternatives[i]:
+                    table_seen.add(alternatives[i][0].lower())
+    
+    # STEP 3: One call names every remaining main and alternative together
+    pending = []
+    for i, (meal_name, description, macros_calculated) in enumerate(kept):
+        if mains[i] and alternatives[i]:
+            continue
+        item = {"idx": i, "meal_type": meal_name}
+        item.update(macros_calculated)
+        if mains[i]:
+            item["main_name"] = mains[i][0]
+        else:
+            item["description"] = description
+        pending.append(item)
+    
+    return {
+        "kept": kept,
+        "mains": mains,
+        "alternatives": alternatives,
+        "pending": pending,
+        "template_prompt": template_prompt,
+        "alt_system_prompt": alt_system_prompt,
+        "translation_scope": translation_scope,
+    }
 
-**MAIN DISH:** {main_meal_name}
-**MAIN PROTEIN SOURCE:** {main_protein_source}
 
-**MEAL DETAILS:**
-- Meal Type: {meal_name}
-- Calories: {macros_calculated['calories']} kcal
-- Protein: {macros_calculated['protein']}g
-- Fat: {macros_calculated['fat']}g
-- Carbs: {macros_calculated['carbs']}g
+def _template_naming_request(plan, model=None):
+    """Chat-completion arguments for the merged naming call over a plan's pending meals."""
+    pending = plan["pending"]
+    prior = [alt[0] for alt in plan["alternatives"] if alt][-TEMPLATE_PROMPT_ALTERNATIVES:]
+    template_user_prompt = f"""Name the main meal and a DIFFERENT alternative meal for each of these meals:
+
+{_json_dumps(pending)}
 
 **PREVIOUSLY GENERATED ALTERNATIVES (MUST AVOID DUPLICATES):**
-{chr(10).join([f"- {alt}" for alt in generated_alternatives]) if generated_alternatives else "None yet"}
+{chr(10).join([f"- {alt}" for alt in prior]) if prior else "None yet"}
 
-**REQUIREMENTS:**
-- Generate a COMPLETELY DIFFERENT meal from the main dish "{main_meal_name}"
-- Must differ in: protein source, carb base, cooking method, and flavour profile
-- Must be UNIQUE - not the same as any previously generated alternative listed above
-- Return ONLY a JSON object with: {{"alternative_name": "<English meal name>", "alternative_protein_source": "<protein source>"}}"""
-                
-                alt_response = client.chat.completions.create(
-                    model=deployment,
-                    messages=[
-                        {"role": "system", "content": alt_system_prompt},
-                        {"role": "user", "content": alt_prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.8  # Higher temperature for more variety
+Main meal names must preserve the client's food preferences; every alternative must be unique."""
+
+    return {
+        "model": model or deployment,
+        "messages": [
+            {"role": "system", "content": plan["template_prompt"]},
+            {"role": "user", "content": template_user_prompt},
+        ],
+        "max_tokens": 180 * len(pending),
+        "temperature": 0.7,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def _apply_template_naming(plan, template_data):
+    """Fill the plan's missing mains and alternatives from a naming-call response."""
+    kept, mains, alternatives = plan["kept"], plan["mains"], plan["alternatives"]
+    with _template_translations_lock:
+        for item in template_data.get("meals") or []:
+            if not isinstance(item, dict) or not isinstance(item.get("idx"), int):
+                continue
+            i = item["idx"]
+            if not 0 <= i < len(kept):
+                continue
+            meal_name, description = kept[i][0], kept[i][1]
+            if mains[i] is None and item.get("main_name"):
+                mains[i] = (item["main_name"], item.get("main_protein_source") or "protein")
+                key = _template_translation_key(description, meal_name, plan["translation_scope"])
+                _template_translations[key] = mains[i]
+                logger.info(f"✅ Translated main meal: '{description}' → '{mains[i][0]}'")
+            if alternatives[i] is None and item.get("alternative_name"):
+                alternatives[i] = (
+                    item["alternative_name"],
+                    item.get("alternative_protein_source") or "protein",
                 )
-                
-                alt_result_text = alt_response.choices[0].message.content
-                logger.info(f"✅ AI response for alternative '{meal_name}': {alt_result_text}")
-                
-                # Parse JSON response
-                cleaned_alt = _strip_markdown_fences(alt_result_text)
-                alt_data = json.loads(cleaned_alt)
-                alt_meal_name = alt_data.get("alternative_name", f"{meal_name} Alternative")
-                alt_protein_source = alt_data.get("alternative_protein_source", "protein")
-                
-                # Track this alternative to avoid duplicates
-                generated_alternatives.append(alt_meal_name)
-                
-                logger.info(f"✅ Generated alternative meal name: {alt_meal_name}")
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ Failed to parse AI response for '{meal_name}': {e}")
-                if alt_result_text:
-                    logger.error(f"Raw response: {alt_result_text}")
-                # Fallback: generate unique alternative name
-                alt_meal_name = f"{meal_name} Alternative {len(generated_alternatives) + 1}"
-                alt_protein_source = "protein"
-                generated_alternatives.append(alt_meal_name)
-                
+        while len(_template_translations) > TEMPLATE_NAME_CACHE_SIZE:
+            _template_translations.popitem(last=False)
+
+
+def _finish_template(plan):
+    """Fall back per meal for anything still unnamed, repair duplicates and build the template."""
+    kept, mains, alternatives = plan["kept"], plan["mains"], plan["alternatives"]
+    alt_system_prompt = plan["alt_system_prompt"]
+    
+    # Untranslated descriptions are used as-is
+    for i, (meal_name, description, _) in enumerate(kept):
+        if mains[i] is None:
+            mains[i] = (description, _guess_protein_source(description))
+    
+    meals = [
+        (meal_name, macros_calculated, main[0], main[1])
+        for (meal_name, _, macros_calculated), main in zip(kept, mains)
+    ]
+    
+    # Generate any alternatives still missing concurrently; duplicates are repaired afterwards
+    missing = [i for i, alternative in enumerate(alternatives) if alternative is None]
+    if missing:
+        futures = {
+            _MEAL_EXECUTOR.submit(
+                _cached_alternative_name, alt_system_prompt, meals[i][0],
+                tuple(sorted(meals[i][1].items())), meals[i][2], meals[i][3],
+            ): i
+            for i in missing
+        }
+        for future in as_completed(futures):
+            meal_name = meals[futures[future]][0]
+            try:
+                alternatives[futures[future]] = future.result()
             except Exception as e:
                 logger.error(f"❌ Error generating alternative meal name for '{meal_name}': {e}")
-                # Fallback: generate unique alternative name
-                alt_meal_name = f"{meal_name} Alternative {len(generated_alternatives) + 1}"
-                alt_protein_source = "protein"
-                generated_alternatives.append(alt_meal_name)
-            
-            # Build main option (format: fat, name, protein, calories, main_protein_source)
-            main_option = {
-                "fat": round(macros_calculated["fat"]),
-                "name": main_meal_name,
-                "protein": round(macros_calculated["protein"]),
-                "calories": round(macros_calculated["calories"]),
-                "main_protein_source": main_protein_source
-            }
-            
-            # Build alternative option (format: fat, name, protein, calories, main_protein_source)
-            alt_option = {
-                "fat": round(macros_calculated["fat"]),
-                "name": alt_meal_name or f"{meal_name} Alternative",
-                "protein": round(macros_calculated["protein"]),
-                "calories": round(macros_calculated["calories"]),
-                "main_protein_source": alt_protein_source or "protein"
-            }
-            
-            template.append({
-                "main": main_option,
-                "meal": meal_name,
-                "alternative": alt_option
-            })
-            
-            logger.info(f"✅ Generated template for '{meal_name}': Main={main_option['name']}, Alt={alt_option['name']}")
+    
+    template = []
+    # Track all generated alternatives to avoid duplicates; only the latest go in prompts
+    seen_alternatives = set()
+    recent_alternatives = deque(maxlen=TEMPLATE_PROMPT_ALTERNATIVES)
+    for (meal_name, macros_calculated, main_meal_name, main_protein_source), alternative in zip(meals, alternatives):
+        if alternative and alternative[0].lower() in seen_alternatives:
+            logger.info(f"🔁 Duplicate alternative '{alternative[0]}' for '{meal_name}', regenerating")
+            try:
+                alternative = _generate_alternative_name(
+                    alt_system_prompt, meal_name, macros_calculated,
+                    main_meal_name, main_protein_source, recent_alternatives,
+                )
+            except Exception as e:
+                logger.error(f"❌ Error regenerating alternative meal name for '{meal_name}': {e}")
+                alternative = None
+            if alternative and alternative[0].lower() in seen_alternatives:
+                alternative = None
+        
+        if alternative:
+            alt_meal_name, alt_protein_source = alternative
+        else:
+            # Fallback: generate unique alternative name
+            alt_meal_name = f"{meal_name} Alternative {len(seen_alternatives) + 1}"
+            alt_protein_source = "protein"
+        
+        # Track this alternative to avoid duplicates
+        seen_alternatives.add(alt_meal_name.lower())
+        recent_alternatives.append(alt_meal_name)
+        
+        # Both options share the meal's targets, so round them once
+        fat = round(macros_calculated["fat"])
+        protein = round(macros_calculated["protein"])
+        calories = round(macros_calculated["calories"])
+        
+        # Build main option (format: fat, name, protein, calories, main_protein_source)
+        main_option = {
+            "fat": fat,
+            "name": main_meal_name,
+            "protein": protein,
+            "calories": calories,
+            "main_protein_source": main_protein_source
+        }
+        
+        # Build alternative option (format: fat, name, protein, calories, main_protein_source)
+        alt_option = {
+            "fat": fat,
+            "name": alt_meal_name or f"{meal_name} Alternative",
+            "protein": protein,
+            "calories": calories,
+            "main_protein_source": alt_protein_source or "protein"
+        }
+        
+        template.append({
+            "main": main_option,
+            "meal": meal_name,
+            "alternative": alt_option
+        })
+        
+        logger.info(f"✅ Generated template for '{meal_name}': Main={main_option['name']}, Alt={alt_option['name']}")
+    
+    return template
+
+
+# Bulk template jobs live in the Supabase table below, keyed by the Azure batch id, so a job
+# survives restarts and redeploys during its 24h window and any worker can answer a poll:
+#   create table template_batches (
+#     batch_id text primary key,
+#     plans jsonb not null,             -- user_code -> plan frozen at submit time
+#     templates jsonb not null,         -- user_code -> finished template
+#     errors jsonb not null,            -- user_code -> error message
+#     status text,                      -- terminal batch status, null while running
+#     claimed_at timestamptz,           -- set by the worker finishing the templates
+#     created_at timestamptz not null default now()
+#   );
+TEMPLATE_BATCHES_TABLE = "template_batches"
+_TEMPLATE_BATCH_TERMINAL = frozenset({"completed", "failed", "expired", "cancelled"})
+TEMPLATE_BATCH_CLAIM_TIMEOUT = datetime.timedelta(minutes=10)  # Reclaim after a worker died finishing
+
+
+def _submit_template_batch(user_codes):
+    """
+    Queue the naming calls for many clients as one Azure OpenAI batch job. Clients whose
+    template needs no model call are finished immediately and returned alongside the job.
+    """
+    if not AZURE_OPENAI_BATCH_DEPLOYMENT:
+        return jsonify({
+            "error": "Bulk template generation is not configured: set AZURE_OPENAI_BATCH_DEPLOYMENT "
+                     "to a Global-Batch deployment"
+        }), 500
+
+    lines, plans, templates, errors = [], {}, {}, {}
+    for code in dict.fromkeys(user_codes):  # One custom_id per client
+        try:
+            meal_structure = load_user_preferences(code).get("meal_plan_structure") or []
+            plan = _plan_template(code, meal_structure)
+            if plan["pending"]:
+                body = _template_naming_request(plan, model=AZURE_OPENAI_BATCH_DEPLOYMENT)
+                lines.append({"custom_id": code, "method": "POST", "url": "/chat/completions", "body": body})
+                plans[code] = plan
+            else:
+                templates[code] = _finish_template(plan)
+        except Exception as e:
+            logger.error(f"❌ Failed to plan template for '{code}': {e}")
+            errors[code] = str(e)
+
+    if not lines:
+        return jsonify({"templates": templates, "errors": errors})
+
+    jsonl = "\n".join(_json_dumps(line) for line in lines).encode("utf-8")
+    input_file = _openai_client().files.create(file=("templates.jsonl", jsonl), purpose="batch")
+    batch = _openai_client().batches.create(
+        input_file_id=input_file.id,
+        endpoint="/chat/completions",
+        completion_window="24h",
+    )
+    try:
+        supabase.table(TEMPLATE_BATCHES_TABLE).insert({
+            "batch_id": batch.id,
+            "plans": plans,
+            "templates": templates,
+            "errors": errors,
+        }).execute()
+    except Exception:
+        # Without its stored plans the job's output could never be used; don't pay for it
+        _openai_client().batches.cancel(batch.id)
+        raise
+    logger.info(f"📦 Submitted template batch {batch.id} for {len(lines)} clients")
+    return jsonify({"batch_id": batch.id, "status": batch.status, "templates": templates, "errors": errors}), 202
+
+
+def _batch_file_lines(file_id):
+    """Parsed JSONL lines of a batch output or error file; none when the file is absent."""
+    if not file_id:
+        return []
+    text = _openai_client().files.content(file_id).text
+    return [_json_loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _batch_line_error(result):
+    """Error message of a batch result line, or None for a successful response."""
+    response = result.get("response") or {}
+    if result.get("error"):
+        error = result["error"]
+    elif response.get("status_code", 200) != 200:
+        error = (response.get("body") or {}).get("error") or f"HTTP {response.get('status_code')}"
+    else:
+        return None
+    return error.get("message", str(error)) if isinstance(error, dict) else str(error)
+
+
+def _collect_template_batch(batch, plans, templates, errors):
+    """Apply a finished batch's naming results to the stored plans and finish each template."""
+    # A failed batch reports why on the job itself (e.g. an invalid input file)
+    job_errors = [error.message for error in getattr(batch.errors, "data", None) or [] if error.message]
+    missing = "; ".join(job_errors) or f"No naming result (batch {batch.status})"
+    named = set()
+    for result in _batch_file_lines(batch.output_file_id) + _batch_file_lines(batch.error_file_id):
+        code = result.get("custom_id")
+        if code not in plans or code in named:
+            continue
+        error = _batch_line_error(result)
+        if error:
+            errors[code] = error
+            continue
+        try:
+            content = result["response"]["body"]["choices"][0]["message"]["content"]
+            _apply_template_naming(plans[code], _json_loads(_strip_markdown_fences(content)))
+            named.add(code)
+            errors.pop(code, None)
+        except Exception as e:
+            logger.warning(f"⚠️ Batch naming result unusable for '{code}', falling back per meal: {e}")
+            errors[code] = str(e)
+
+    for code, plan in plans.items():
+        if code not in named:
+            errors.setdefault(code, missing)
+        try:
+            templates[code] = _finish_template(plan)
+        except Exception as e:
+            logger.error(f"❌ Failed to finish template for '{code}': {e}")
+            errors[code] = str(e)
+
+
+@app.route("/api/template", methods=["POST"])
+def api_template():
+    """
+    New template generation approach:
+    1. Get meal plan structure
+    2. Generate meal names (main and alternative) using AI
+    3. Calculate macros using Python (like DSPy)
+    4. Return template JSON
+
+    With {"bulk": true, "user_codes": [...]} the naming calls for every listed client are
+    submitted through the Batch API instead; poll /api/template/batch/<batch_id> for results.
+    """
+    try:
+        data = request.get_json()
+        user_code = data.get("user_code") if data else None
+
+        if data and data.get("bulk"):
+            user_codes = data.get("user_codes") or ([user_code] if user_code else [])
+            if not user_codes:
+                return jsonify({"error": "No user codes provided for bulk template generation"}), 400
+            return _submit_template_batch(user_codes)
+
+        meal_structure = data.get("meal_structure") or data.get("meal_plan_structure")
+        result, status = _generate_template_impl(user_code, meal_structure)
+        return jsonify(result), status
+        
+    except Exception as e:
+        logger.error(f"❌ Exception in /api/template: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
+
+def _generate_template_impl(user_code, meal_structure=None):
+    """
+    Generate a client's template; returns (result, http_status) like the /api/template route.
+    meal_structure defaults to the one stored in the client's preferences.
+    """
+    try:
+        # If not provided in request, load from preferences
+        if not meal_structure:
+            preferences = load_user_preferences(user_code)
+            meal_structure = preferences.get("meal_plan_structure", [])
+        
+        if not meal_structure or len(meal_structure) == 0:
+            return {"error": "No meal plan structure provided"}, 400
+        
+        plan = _plan_template(user_code, meal_structure)
+        
+        # One call names every remaining main and alternative together
+        if plan["pending"]:
+            try:
+                template_result = _stream_json_completion(**_template_naming_request(plan))
+                _apply_template_naming(plan, _json_loads(_strip_markdown_fences(template_result)))
+                logger.info(f"✅ Named {len(plan['pending'])} template meals in one call")
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to name template meals, falling back per meal: {e}")
+        
+        template = _finish_template(plan)
         
         logger.info(f"✅ Generated template with {len(template)} meals using new approach")
-        return jsonify({"template": template})
+        return {"template": template}, 200
         
     except Exception as e:
         logger.error(f"❌ Exception in /api/template: {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
+        return {"error": str(e)}, 500
+
+
+@app.route("/api/template/batch/<batch_id>", methods=["GET"])
+def api_template_batch(batch_id):
+    """Status of a bulk template job; once it has ended, the finished templates by user code."""
+    try:
+        table = supabase.table(TEMPLATE_BATCHES_TABLE)
+        rows = table.select("*").eq("batch_id", batch_id).limit(1).execute().data or []
+        if not rows:
+            return jsonify({"error": f"Unknown template batch '{batch_id}'"}), 404
+        job = rows[0]
+
+        if not job.get("status"):
+            batch = _openai_client().batches.retrieve(batch_id)
+            if batch.status not in _TEMPLATE_BATCH_TERMINAL:
+                return jsonify({"batch_id": batch_id, "status": batch.status}), 202
+
+            # Claim the job so the templates are finished once, whichever worker gets the poll
+            now = datetime.datetime.now(_UTC)
+            stale = (now - TEMPLATE_BATCH_CLAIM_TIMEOUT).strftime("%Y-%m-%dT%H:%M:%SZ")
+            claimed = (
+                table.update({"claimed_at": now.strftime("%Y-%m-%dT%H:%M:%SZ")})
+                .eq("batch_id", batch_id)
+                .is_("status", "null")
+                .or_(f"claimed_at.is.null,claimed_at.lt.{stale}")
+                .execute()
+                .data
+            )
+            if not claimed:
+                return jsonify({"batch_id": batch_id, "status": "finalizing"}), 202
+
+            templates, errors = job.get("templates") or {}, job.get("errors") or {}
+            try:
+                _collect_template_batch(batch, job.get("plans") or {}, templates, errors)
+            except Exception:
+                table.update({"claimed_at": None}).eq("batch_id", batch_id).execute()  # Let the next poll retry
+                raise
+            table.update({
+                "plans": {},
+                "templates": templates,
+                "errors": errors,
+                "status": batch.status,
+            }).eq("batch_id", batch_id).execute()
+            job.update(templates=templates, errors=errors, status=batch.status)
+            logger.info(f"📦 Template batch {batch_id} ended as '{batch.status}'")
+
+        return jsonify({
+            "batch_id": batch_id,
+            "status": job["status"],
+            "templates": job.get("templates") or {},
+            "errors": job.get("errors") or {},
+        })
+
+    except Exception as e:
+        logger.error(f"❌ Exception in /api/template/batch: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({"error": str(e)}), 500
 
 
+_MACRO_KEYS = ("calories", "protein", "fat", "carbs")  # Targets every meal option carries
+_MACRO_KEY_SET = frozenset(_MACRO_KEYS)
+
+
 def calculate_totals(meals):
-    totals = {"calories": 0, "protein": 0, "fat": 0, "carbs": 0}
+    # Plain local accumulators: a menu has a handful of options, so this stays a single pass
+    calories = protein = fat = carbs = 0
 
     for meal in meals:
-        for option_key in ["main", "alternative"]:
-            option = meal.get(option_key)
-            if option and option.get("nutrition"):
-                for macro in totals:
-                    value = option["nutrition"].get(macro, 0)
-                    totals[macro] += float(value)
+        for option in (meal.get("main"), meal.get("alternative")):
+            nutrition = option.get("nutrition") if option else None
+            if nutrition:
+                calories += float(nutrition.get("calories", 0))
+                protein += float(nutrition.get("protein", 0))
+                fat += float(nutrition.get("fat", 0))
+                carbs += float(nutrition.get("carbs", 0))
 
-    return totals
+    return {"calories": calories, "protein": protein, "fat": fat, "carbs": carbs}
 
 
 # ---------- Helpers & Prompt (top-level) ----------
 
+MEAL_BUILDER_MAX_TOKENS = 1200  # One meal with its ingredient list; bounds decode time
+
+# Fixed rules first and per-request values under THIS REQUEST at the end, so the provider can
+# reuse its cached prompt prefix across clients (same layout for ALTERNATIVE_GENERATOR_PROMPT)
 MEAL_BUILDER_PROMPT = """You are a professional HEALTHY dietitian AI.
 
 TASK
 
-Build the {option_type} option for ONE meal using the exact macro targets provided.
+Build the requested option (OPTION under THIS REQUEST) for ONE meal using the exact macro targets provided.
 
 Return JSON ONLY (no markdown, no comments).
 
@@ -1909,35 +3092,65 @@ HARD RULES
 
 • Only include unhealthy processed items if client explicitly requests them in preferences.
 
-• **CRITICAL: STRICTLY AVOID ALL FOODS IN ALLERGIES LIST** - This is life-threatening: {allergies_list}
+• **CRITICAL: STRICTLY AVOID ALL FOODS IN ALLERGIES LIST** - This is life-threatening (see ALLERGIES under THIS REQUEST).
 
-• **CRITICAL: STRICTLY FOLLOW ALL DIETARY LIMITATIONS** - Never include these foods/ingredients: {limitations_list}
+• **CRITICAL: STRICTLY FOLLOW ALL DIETARY LIMITATIONS** - Never include these foods/ingredients (see DIETARY LIMITATIONS under THIS REQUEST).
 
 • If kosher: never mix meat + dairy; avoid non-kosher meats (pork, shellfish); use kosher-suitable brands.
 
 • ≤ 7 ingredients per dish; simple methods (grill, bake, steam, sauté).
 
-• Use realistic regional pack sizes and brands:
-
-  {region_instruction}
+• Use realistic regional pack sizes and brands (see REGION under THIS REQUEST).
 
 MACRO TARGETS
 
-• EXACTLY match these targets (0% tolerance): {macro_targets}.
+• EXACTLY match the MACRO TARGETS under THIS REQUEST (0% tolerance).
 
-• The primary protein for this option MUST be: {required_protein_source} (include it clearly as an ingredient).
+• The primary protein for this option MUST be the REQUIRED PROTEIN under THIS REQUEST (include it clearly as an ingredient).
 
 • Ingredients and total nutrition must sum to the exact targets.
 
-• CRITICAL: Cross-check every ingredient's macro values against reliable nutrition databases to ensure accuracy.
+• CRITICAL: Cross-check every ingredient's macro values against reliable nutrition databases to ensure accuracy.
+
+VARIETY / DIFFERENTIATION
+
+• Avoid the AVOID PROTEINS listed under THIS REQUEST.
+
+• Avoid the AVOID INGREDIENTS listed under THIS REQUEST (substring match).
+
+• For ALTERNATIVE, it must differ from MAIN in protein source, carb base, cooking method, and flavour profile.
+
+VALIDATION
+
+• No narrative text. Return only the JSON object described above.
+
+• Do not add keys not listed in the schema.
+
+• cross-check every ingredient's macros against its nutrition database - ensure all Macros & Caloriesvalues are accurate.
+
+    
+
+• If you see a previous meal attempt in this prompt, analyze what went wrong and fix those specific issues.
+
+• Pay special attention to macro calculations, ingredient accuracy, and dietary restrictions.
+
+THIS REQUEST
+
+• OPTION: {option_type}
+
+• ALLERGIES (LIFE THREATENING - ZERO TOLERANCE): {allergies_list}
+
+• DIETARY LIMITATIONS: {limitations_list}
+
+• REGION: {region_instruction}
 
-VARIETY / DIFFERENTIATION
+• MACRO TARGETS: {macro_targets}
 
-• Avoid these protein sources: {avoid_proteins}.
+• REQUIRED PROTEIN: {required_protein_source}
 
-• Avoid these core ingredients (substring match): {avoid_ingredients}.
+• AVOID PROTEINS: {avoid_proteins}
 
-• For ALTERNATIVE, it must differ from MAIN in protein source, carb base, cooking method, and flavour profile.
+• AVOID INGREDIENTS: {avoid_ingredients}
 
 PREVIOUS ISSUES TO AVOID
 
@@ -1946,72 +3159,69 @@ PREVIOUS ISSUES TO AVOID
 CURRENT VALIDATION FEEDBACK
 
 {validation_feedback_section}
+"""
 
-VALIDATION
-
-• No narrative text. Return only the JSON object described above.
-
-• Do not add keys not listed in the schema.
-
-• cross-check every ingredient's macros against its nutrition database - ensure all Macros & Caloriesvalues are accurate.
-
-    
-
-• If you see a previous meal attempt above, analyze what went wrong and fix those specific issues.
-
-• Pay special attention to macro calculations, ingredient accuracy, and dietary restrictions.
 
-"""
+# Opening fence, optional language tag on its own short first line, then everything up to the
+# last closing fence (anything after it is dropped); an unterminated fence keeps the rest
+_FENCE_RE = re.compile(
+    r"```(?:(?=[^\n]{1,19}\n)[^\S\n]*[^\W\d_]+[^\S\n]*\n)?(?:(.*)```.*|(.*))", re.DOTALL
+)
 
 
 def _strip_markdown_fences(s: str) -> str:
     s = s.strip()
+    m = _FENCE_RE.fullmatch(s)
+    if not m:
+        return s
+    return (m.group(1) if m.group(1) is not None else m.group(2)).strip()
 
-    if s.startswith("```"):
-        s = s.split("```", 1)[-1]
 
-        # Remove language tag (e.g., "json", "python") if present on first line
-        first_newline = s.find("\n")
-        if first_newline > 0 and first_newline < 20:  # Language tag is usually short
-            first_line = s[:first_newline].strip()
-            # Check if first line is just a language identifier (no special chars)
-            if first_line and first_line.isalpha():
-                s = s[first_newline + 1 :]
+# Scripts that mark a menu string as untranslated: Cyrillic, Hebrew + Arabic, Hiragana + Katakana,
+# CJK Unified Ideographs and Hangul. Other non-ASCII (dashes, smart quotes, degrees) is allowed
+_NON_LATIN_RE = re.compile(r"[\u0400-\u04FF\u0590-\u06FF\u3040-\u30FF\u4E00-\u9FFF\uAC00-\uD7AF]")
 
-        if "```" in s:
-            s = s.rsplit("```", 1)[0]
 
-    return s.strip()
+_KOSHER_MEAT_ITEMS = ("chicken", "beef", "lamb", "turkey", "duck", "meat", "poultry")
+_KOSHER_DAIRY_ITEMS = (
+    "milk", "cream", "cheese", "yogurt", "butter", "dairy",
+    "parmesan", "mozzarella", "ricotta", "cottage cheese",
+)
+_NON_KOSHER_ITEMS = (
+    "pork", "bacon", "ham", "shellfish", "shrimp",
+    "lobster", "crab", "clam", "oyster", "scallop",
+)
+_KOSHER_MATCHER = SubstringMatcher(_KOSHER_MEAT_ITEMS + _KOSHER_DAIRY_ITEMS + _NON_KOSHER_ITEMS)
+
+
+_REGION_PACK_INSTRUCTIONS = MappingProxyType({
+    "israel": (
+        "Use Israeli brands (Tnuva, Osem, Strauss, Elite, Telma). "
+        "Typical packs: cottage cheese 250g; yogurt 150–200g; hummus 400g; "
+        "pita 60–80g; cheese slices 20–25g; Bamba 80g; Bissli 100g."
+    ),
+    "us": (
+        "Use US brands (Kraft, General Mills, Kellogg's). Packs: cottage cheese 16oz/454g; "
+        "yogurt 6–8oz/170–227g; cream cheese 8oz/227g; cheese slices 21g; bagel 95–105g."
+    ),
+    "uk": (
+        "Use UK brands (Tesco, Sainsbury's, Heinz UK). Packs: cottage cheese 300g; yogurt 150–170g; "
+        "cheese slices 25g; bread slices 35–40g."
+    ),
+    "canada": (
+        "Use Canadian brands (Loblaws, President's Choice). Packs: cottage cheese 500g; "
+        "yogurt 175g; cheese slices 22g."
+    ),
+    "australia": (
+        "Use Australian brands (Woolworths, Coles, Arnott's). Packs: cottage cheese 250g; "
+        "yogurt 170g; cheese slices 25g."
+    ),
+})
 
 
 def _region_instruction_from_prefs(preferences: dict) -> str:
     region = (preferences.get("region") or "israel").lower()
-
-    mapping = {
-        "israel": (
-            "Use Israeli brands (Tnuva, Osem, Strauss, Elite, Telma). "
-            "Typical packs: cottage cheese 250g; yogurt 150–200g; hummus 400g; "
-            "pita 60–80g; cheese slices 20–25g; Bamba 80g; Bissli 100g."
-        ),
-        "us": (
-            "Use US brands (Kraft, General Mills, Kellogg's). Packs: cottage cheese 16oz/454g; "
-            "yogurt 6–8oz/170–227g; cream cheese 8oz/227g; cheese slices 21g; bagel 95–105g."
-        ),
-        "uk": (
-            "Use UK brands (Tesco, Sainsbury's, Heinz UK). Packs: cottage cheese 300g; yogurt 150–170g; "
-            "cheese slices 25g; bread slices 35–40g."
-        ),
-        "canada": (
-            "Use Canadian brands (Loblaws, President's Choice). Packs: cottage cheese 500g; "
-            "yogurt 175g; cheese slices 22g."
-        ),
-        "australia": (
-            "Use Australian brands (Woolworths, Coles, Arnott's). Packs: cottage cheese 250g; "
-            "yogurt 170g; cheese slices 25g."
-        ),
-    }
-
-    return mapping.get(region, mapping["israel"])
+    return _REGION_PACK_INSTRUCTIONS.get(region, _REGION_PACK_INSTRUCTIONS["israel"])
 
 
 def _calculate_nutrition_from_ingredients(meal_data):
@@ -2022,25 +3232,44 @@ def _calculate_nutrition_from_ingredients(meal_data):
     if not meal_data or "ingredients" not in meal_data:
         return meal_data
 
-    # Calculate totals from ingredients
-    nutrition = {"calories": 0, "protein": 0, "fat": 0, "carbs": 0}
+    # Calculate totals from ingredients (local accumulators, one pass)
+    calories = protein = fat = carbs = 0
 
     for ingredient in meal_data.get("ingredients", []):
-        nutrition["calories"] += float(ingredient.get("calories", 0))
-        nutrition["protein"] += float(ingredient.get("protein", 0))
-        nutrition["fat"] += float(ingredient.get("fat", 0))
-        nutrition["carbs"] += float(ingredient.get("carbs", 0))
+        calories += float(ingredient.get("calories", 0))
+        protein += float(ingredient.get("protein", 0))
+        fat += float(ingredient.get("fat", 0))
+        carbs += float(ingredient.get("carbs", 0))
 
-    # Round to 1 decimal place for consistency
-    for macro in nutrition:
-        nutrition[macro] = round(nutrition[macro], 1)
-
-    # Add nutrition to meal data
-    meal_data["nutrition"] = nutrition
+    # Round to 1 decimal place for consistency and add nutrition to meal data
+    meal_data["nutrition"] = {
+        "calories": round(calories, 1),
+        "protein": round(protein, 1),
+        "fat": round(fat, 1),
+        "carbs": round(carbs, 1),
+    }
 
     return meal_data
 
 
+def _is_within_tolerance(meal_data, macro_targets, tol=0.02):
+    """True when the ingredient sums already hit every numeric macro target within tol (relative)."""
+    checked = 0
+    try:
+        ingredients = meal_data.get("ingredients") or []
+        for macro in ("calories", "protein", "fat", "carbs"):
+            target = macro_targets.get(macro)
+            if not isinstance(target, (int, float)):
+                continue
+            total = sum(float(ingredient.get(macro, 0)) for ingredient in ingredients)
+            if abs(total - target) > tol * max(abs(target), 1):
+                return False
+            checked += 1
+    except (AttributeError, TypeError, ValueError):
+        return False
+    return bool(ingredients) and checked > 0
+
+
 def _build_option_with_retries(
     option_type: str,
     meal_name: str,
@@ -2094,15 +3323,7 @@ def _build_option_with_retries(
                 wrapped_template = [{tpl_key: macro_targets}]
                 wrapped_menu = [{tpl_key: result}]
 
-                val_res = app.test_client().post(
-                    "/api/validate-menu",
-                    json={
-                        "template": wrapped_template,
-                        "menu": wrapped_menu,
-                        "user_code": user_code,
-                    },
-                )
-                val = val_res.get_json() or {}
+                val, _ = _validate_menu_impl(wrapped_template, wrapped_menu, user_code)
 
                 if val.get("is_valid"):
                     logger.info(f"✅ DSPy result passed validation for '{meal_name}'")
@@ -2122,9 +3343,9 @@ def _build_option_with_retries(
                         f"⚠️ DSPy result failed validation for '{meal_name}' [{option_type.upper()}], falling back to legacy approach"
                     )
                     logger.warning(f"   Validation issues: {issues}")
-                    if failed_meal:
+                    if failed_meal and logger.isEnabledFor(logging.WARNING):
                         logger.warning(
-                            f"   Failed meal data: {json.dumps(failed_meal, ensure_ascii=False, indent=2)[:500]}..."
+                            f"   Failed meal data: {_json_dumps(failed_meal, indent=True)[:500]}..."
                         )
             else:
                 logger.warning(f"⚠️ DSPy pipeline returned None, falling back to legacy approach")
@@ -2173,7 +3394,8 @@ def _build_option_with_retries(
                 limitations_list=limitations_list,
             )
 
-            user_payload = {"meal_name": meal_name, "preferences": preferences}
+            # JSON needs a real dict; materialized only here, for the first attempt's payload
+            user_payload = {"meal_name": meal_name, "preferences": dict(preferences)}
 
         else:
             # RETRY ATTEMPTS: Focused correction prompt
@@ -2247,48 +3469,49 @@ Format:
 
         # Construct user message based on attempt type
         if i == 0:
-            user_message_content = json.dumps(user_payload, ensure_ascii=False)
+            user_message_content = _json_dumps(user_payload)
         else:
             user_message_content = user_payload  # Already a formatted string
 
         # Use OBI2 for all attempts (first attempt and retries)
         logger.info(f"🔧 Using OBI2 for meal building (attempt {i+1})")
-        response = client.chat.completions.create(
+        content = _stream_json_completion(
             model=deployment,
             messages=[
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": user_message_content},
             ],
+            max_tokens=MEAL_BUILDER_MAX_TOKENS,
+            response_format={"type": "json_object"},
         )
 
-        raw = _strip_markdown_fences(response.choices[0].message.content)
+        raw = _strip_markdown_fences(content)
 
         try:
-            candidate = json.loads(raw)
+            candidate = _json_loads(raw)
         except Exception as e:
             error_msg = f"JSON parse error: {e}"
             logger.warning(f"❌ {error_msg} for {option_type} '{meal_name}'")
             previous_issues.append(error_msg)
             continue
 
-        # Apply nutrition correction IMMEDIATELY after generation, BEFORE validation
-        candidate, correction_success = _correct_meal_nutrition(candidate, macro_targets)
+        # Apply nutrition correction IMMEDIATELY after generation, BEFORE validation,
+        # unless the ingredients already sum to the targets
+        if _is_within_tolerance(candidate, macro_targets):
+            logger.info(f"✅ {option_type} for '{meal_name}' already within macro tolerance, skipping correction")
+        else:
+            candidate, correction_success = _correct_meal_nutrition(candidate, macro_targets)
 
-        if correction_success:
-            logger.info(f"✅ Nutrition values corrected by correction AI")
-        # If correction failed or was skipped, candidate already contains original meal
+            if correction_success:
+                logger.info(f"✅ Nutrition values corrected by correction AI")
+            # If correction failed or was skipped, candidate already contains original meal
 
         # Wrap for validator
         tpl_key = "main" if option_type.upper() == "MAIN" else "alternative"
         wrapped_template = [{tpl_key: macro_targets}]
         wrapped_menu = [{tpl_key: candidate}]
 
-        val_res = app.test_client().post(
-            "/api/validate-menu",
-            json={"template": wrapped_template, "menu": wrapped_menu, "user_code": user_code},
-        )
-
-        val = val_res.get_json() or {}
+        val, _ = _validate_menu_impl(wrapped_template, wrapped_menu, user_code)
 
         if val.get("is_valid"):
             logger.info(f"✅ {option_type} for '{meal_name}' passed validation.")
@@ -2308,23 +3531,26 @@ Format:
             issues = val.get("issues", [])
             failed_meal = val.get("meal_data", {})
 
-            logger.warning(
-                f"❌ {option_type} for '{meal_name}' failed validation. Meal: {json.dumps(failed_meal, ensure_ascii=False)}, Issues: {issues}"
-            )
+            if logger.isEnabledFor(logging.WARNING):
+                logger.warning(
+                    f"❌ {option_type} for '{meal_name}' failed validation. Meal: {_json_dumps(failed_meal)}, Issues: {issues}"
+                )
 
             # Add issues to running list
             previous_issues.extend(issues)
 
-            # Format validation feedback for next retry
-            validation_feedback = f"""
+            # Format validation feedback for next retry (nothing consumes it after the last one)
+            if i < max_attempts - 1:
+                issue_lines = "\n".join(f"• {issue}" for issue in issues)
+                validation_feedback = f"""
 
 **FAILED MEAL FROM PREVIOUS ATTEMPT:**
 
-{json.dumps(failed_meal, indent=2, ensure_ascii=False) if failed_meal else "N/A"}
+{_json_dumps(failed_meal, indent=True) if failed_meal else "N/A"}
 
 **ISSUES TO FIX:**
 
-{chr(10).join([f"• {issue}" for issue in issues])}
+{issue_lines}
 
 """
 
@@ -2375,18 +3601,17 @@ def _build_single_meal_option(
         }
 
         # Validate targets (only macros required; name is optional)
-        macro_keys = ("calories", "protein", "fat", "carbs")
-        if any(targets.get(k) is None for k in macro_keys):
+        if any(targets.get(k) is None for k in _MACRO_KEYS):
             logger.error(f"❌ Template missing macro targets for {option_type} '{meal_name}'")
             return (meal_name, option_type, None, f"Missing macro targets: {targets}")
 
         # Build per-option preferences so the meal builder can follow the template's intended title
         # (especially important for ALTERNATIVE, which otherwise intentionally ignores user text preferences for variety)
-        prefs_for_option = dict(preferences or {})
-        if template_meal_title:
-            prefs_for_option["template_meal_title"] = template_meal_title
-        prefs_for_option["template_meal_slot"] = meal_name
-        prefs_for_option["template_option_type"] = option_type
+        # (a ChainMap overlay, so the shared preferences are not copied for every option)
+        overlay = {"template_meal_title": template_meal_title} if template_meal_title else {}
+        overlay["template_meal_slot"] = meal_name
+        overlay["template_option_type"] = option_type
+        prefs_for_option = ChainMap(overlay, preferences or {})
 
         # Build the option (without correction, that happens inside _build_option_with_retries now)
         result = _build_option_with_retries(
@@ -2413,6 +3638,22 @@ def _build_single_meal_option(
         return (meal_name, option_type, None, str(e))
 
 
+BUILD_RETRY_BACKOFFS = (0.5, 1.0, 2.0)  # Seconds before build-menu attempts 2, 3, 4 (+ jitter)
+
+
+def _sleep_before_retry(attempt):
+    """Back off after a failed build attempt so transient upstream errors (429/5xx) can clear."""
+    delay = BUILD_RETRY_BACKOFFS[min(attempt, len(BUILD_RETRY_BACKOFFS)) - 1]
+    time.sleep(delay + random.random() * 0.5)
+
+
+# Fixed build-menu error bodies, serialized once at import
+_MISSING_TEMPLATE_BODY = _json_dumps({"error": "Missing template"})
+_MISSING_USER_CODE_BODY = _json_dumps({"error": "Missing user_code"})
+
+_OPTION_SLOTS = MappingProxyType({"MAIN": 0, "ALTERNATIVE": 1})  # Position in a meal's build results
+
+
 # ---------- Route ----------
 
 
@@ -2420,19 +3661,25 @@ def _build_single_meal_option(
 def api_build_menu():
     max_retries = 4  # Try 4 times before giving up
 
+    # Start each build from fresh preferences; every attempt below then reuses the cached copy
+    invalidate_user_preferences((request.get_json(silent=True) or {}).get("user_code"))
+
+    template = None  # Set from the request, then replaced when a template is regenerated
+    validations = {}  # Serialized template -> validation result, so retries skip revalidating it
+
     for attempt in range(1, max_retries + 1):
         try:
             logger.info(f"🔄 Attempt {attempt}/{max_retries} to build menu")
 
             data = request.json or {}
-            template = data.get("template")
+            template = template or data.get("template")
             user_code = data.get("user_code")
 
             if not template:
-                return jsonify({"error": "Missing template"}), 400
+                return _static_json_response(_MISSING_TEMPLATE_BODY, 400)
 
             if not user_code:
-                return jsonify({"error": "Missing user_code"}), 400
+                return _static_json_response(_MISSING_USER_CODE_BODY, 400)
 
             preferences = load_user_preferences(user_code) or {}
 
@@ -2457,10 +3704,12 @@ def api_build_menu():
             region_instruction = _region_instruction_from_prefs(preferences)
 
             # ✅ Validate the template before building meals
-            val_res = app.test_client().post(
-                "/api/validate-template", json={"template": template, "user_code": user_code}
-            )
-            val_data = val_res.get_json() or {}
+            template_key = _json_dumps(template)
+            val_data = validations.get(template_key)
+            if val_data is None:
+                val_data, val_status = _validate_template_impl(template, user_code, preferences)
+                if val_status == 200:  # Errors are not a verdict on the template; retry them
+                    validations[template_key] = val_data
 
             if not val_data.get("is_valid"):
                 logger.warning(
@@ -2477,22 +3726,20 @@ def api_build_menu():
                     logger.info(f"🔄 Regenerating template for attempt {attempt + 1}")
 
                     try:
-                        template_res = app.test_client().post(
-                            "/api/template", json={"user_code": user_code}
-                        )
+                        template_data, template_status = _generate_template_impl(user_code)
 
-                        if template_res.status_code == 200:
-                            template_data = template_res.get_json() or {}
+                        if template_status == 200:
 
                             if template_data.get("template"):
                                 template = template_data["template"]
+                                validations.clear()
                                 logger.info(f"✅ Generated new template for attempt {attempt + 1}")
                                 continue  # retry with the new template
                             else:
                                 logger.error("❌ New template generation returned invalid data")
                         else:
                             logger.error(
-                                f"❌ Template regeneration failed with status {template_res.status_code}"
+                                f"❌ Template regeneration failed with status {template_status}"
                             )
 
                     except Exception as template_error:
@@ -2515,6 +3762,7 @@ def api_build_menu():
                         400,
                     )
                 else:
+                    _sleep_before_retry(attempt)
                     continue  # next attempt
 
             logger.info("🔹 Building menu in PARALLEL - ALL meal options at once...")
@@ -2527,42 +3775,44 @@ def api_build_menu():
             )
 
             # Submit all tasks at once
-            all_results = {}  # Key: (index, meal_name) tuple to handle duplicate meal names
-            with ThreadPoolExecutor(max_workers=total_options) as executor:
-                all_futures = {}
-
-                # Submit all MAIN and ALTERNATIVE tasks simultaneously
-                for meal_index, template_meal in enumerate(template):
-                    meal_name = template_meal.get("meal")
-                    meal_key = (meal_index, meal_name)  # Use index to make unique
-
-                    # Submit MAIN task
-                    main_future = executor.submit(
-                        _build_single_meal_option,
-                        template_meal,
-                        "MAIN",
-                        preferences,
-                        user_code,
-                        region_instruction,
-                    )
-                    all_futures[main_future] = (meal_key, "MAIN")
-
-                    # Submit ALTERNATIVE task (running in parallel with MAIN)
-                    # Note: Since they run in parallel, ALTERNATIVE won't have MAIN's ingredients to avoid
-                    # The AI will differentiate based on the prompt instructions
-                    alt_future = executor.submit(
-                        _build_single_meal_option,
-                        template_meal,
-                        "ALTERNATIVE",
-                        preferences,
-                        user_code,
-                        region_instruction,
-                        None,  # avoid_proteins - will be handled by prompt
-                        None,  # avoid_ingredients - will be handled by prompt
-                    )
-                    all_futures[alt_future] = (meal_key, "ALTERNATIVE")
+            all_results = [[None, None] for _ in template]  # Per meal index: [MAIN, ALTERNATIVE]
+            all_futures = {}
+
+            # Submit all MAIN and ALTERNATIVE tasks simultaneously
+            for meal_index, template_meal in enumerate(template):
+                meal_name = template_meal.get("meal")
+                meal_key = (meal_index, meal_name)  # Use index to make unique
+
+                # Submit MAIN task
+                main_future = _MEAL_EXECUTOR.submit(
+                    _build_single_meal_option,
+                    template_meal,
+                    "MAIN",
+                    preferences,
+                    user_code,
+                    region_instruction,
+                )
+                all_futures[main_future] = (meal_key, "MAIN")
+
+                # Submit ALTERNATIVE task (running in parallel with MAIN)
+                # Note: Since they run in parallel, ALTERNATIVE won't have MAIN's ingredients to avoid
+                # The AI will differentiate based on the prompt instructions
+                alt_future = _MEAL_EXECUTOR.submit(
+                    _build_single_meal_option,
+                    template_meal,
+                    "ALTERNATIVE",
+                    preferences,
+                    user_code,
+                    region_instruction,
+                    None,  # avoid_proteins - will be handled by prompt
+                    None,  # avoid_ingredients - will be handled by prompt
+                )
+                all_futures[alt_future] = (meal_key, "ALTERNATIVE")
 
-                # Collect all results as they complete
+            # Collect all results as they complete. Whatever ends the loop early (a failed
+            # option or an exception), builds that have not started yet are cancelled so they
+            # do not spend LLM calls on a menu that will be thrown away.
+            try:
                 for future in as_completed(all_futures):
                     meal_name_returned, option_type_returned, result, error = future.result()
                     expected_meal_key, expected_option = all_futures[future]
@@ -2585,27 +3835,21 @@ def api_build_menu():
                             400,
                         )
 
-                    # Store result with key (index, meal_name) to handle duplicate meal names
-                    if expected_meal_key not in all_results:
-                        all_results[expected_meal_key] = {}
-                    all_results[expected_meal_key][option_type_returned] = result
+                    # Store result by meal index (unique even when meal names repeat)
+                    all_results[expected_meal_key[0]][_OPTION_SLOTS[option_type_returned]] = result
 
                     logger.info(f"✅ Completed {option_type_returned} for meal at index {expected_meal_key[0]} ({expected_meal_key[1]})")
+            finally:
+                for future in all_futures:
+                    future.cancel()
 
             logger.info(f"✅ Successfully built all {total_options} meal options in parallel!")
 
             # Assemble the full menu in the correct order
-            full_menu = []
-            for meal_index, template_meal in enumerate(template):
-                meal_name = template_meal.get("meal")
-                meal_key = (meal_index, meal_name)
-                full_menu.append(
-                    {
-                        "meal": meal_name,
-                        "main": all_results[meal_key]["MAIN"],
-                        "alternative": all_results[meal_key]["ALTERNATIVE"],
-                    }
-                )
+            full_menu = [
+                {"meal": template_meal.get("meal"), "main": main, "alternative": alternative}
+                for template_meal, (main, alternative) in zip(template, all_results)
+            ]
 
             logger.info("✅ Finished building full menu.")
 
@@ -2614,34 +3858,31 @@ def api_build_menu():
             # Clean ingredient names before returning
             cleaned_menu = clean_ingredient_names(full_menu)
 
-            logger.info(
-                "Full menu built: %s",
-                json.dumps({"menu": cleaned_menu, "totals": totals}, ensure_ascii=False, indent=2),
-            )
+            logger.info("Full menu built: meals=%d totals=%s", len(cleaned_menu), totals)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Full menu: %s", _json_dumps({"menu": cleaned_menu, "totals": totals}))
 
-            return jsonify({"menu": cleaned_menu, "totals": totals})
+            return _json_list_response("menu", cleaned_menu, {"totals": totals})
 
         except Exception as e:
-            logger.error(
-                "❌ Exception in /api/build-menu (attempt %d):\n%s", attempt, traceback.format_exc()
-            )
+            tb = traceback.format_exc()  # Formatted once for the log and the debug response
+            logger.error("❌ Exception in /api/build-menu (attempt %d):\n%s", attempt, tb)
 
             if attempt == max_retries:
-                return (
-                    jsonify(
-                        {
-                            "error": f"Menu build failed after {max_retries} attempts",
-                            "exception": str(e),
-                            "attempt": attempt,
-                            "max_retries": max_retries,
-                            "failure_type": "exception_during_build",
-                            "traceback": traceback.format_exc(),
-                        }
-                    ),
-                    500,
-                )
+                failure = {
+                    "error": f"Menu build failed after {max_retries} attempts",
+                    "exception": str(e),
+                    "attempt": attempt,
+                    "max_retries": max_retries,
+                    "failure_type": "exception_during_build",
+                }
+                # Stack traces stay in the server log outside debug mode
+                if app.debug:
+                    failure["traceback"] = tb
+                return jsonify(failure), 500
             else:
                 logger.info("🔄 Retrying menu build due to exception...")
+                _sleep_before_retry(attempt)
                 continue
 
     # If we get here, all attempts failed
@@ -2662,19 +3903,20 @@ def api_build_menu():
 
 @app.route("/api/validate-menu", methods=["POST"])
 def api_validate_menu():
+    data = request.json or {}
+    result, status = _validate_menu_impl(data.get("template"), data.get("menu"), data.get("user_code"))
+    return jsonify(result), status
 
-    try:
-
-        data = request.json or {}
-
-        template = data.get("template")
-
-        menu = data.get("menu")
 
-        user_code = data.get("user_code")
+def _validate_menu_impl(template, menu, user_code):
+    """
+    Validate one menu option against its template entry.
+    Returns (result, http_status) so in-process callers skip the HTTP round trip.
+    """
+    try:
 
         if not template or not menu or not isinstance(template, list) or not isinstance(menu, list):
-            return jsonify({"is_valid": False, "issues": ["Missing or invalid template/menu"]}), 400
+            return {"is_valid": False, "issues": ["Missing or invalid template/menu"]}, 400
 
         # Load user preferences for dietary restrictions (best-effort)
         try:
@@ -2684,7 +3926,6 @@ def api_validate_menu():
             preferences = {}
 
         limitations = [str(x).lower() for x in preferences.get("limitations", [])]
-        macros = ["calories", "protein", "fat", "carbs"]
         issues = []
 
         # Which option are we validating? (builder sends exactly one)
@@ -2704,12 +3945,10 @@ def api_validate_menu():
         if option is None:
 
             return (
-                jsonify(
-                    {
-                        "is_valid": False,
-                        "issues": ["Could not detect option type (main/alternative)"],
-                    }
-                ),
+                {
+                    "is_valid": False,
+                    "issues": ["Could not detect option type (main/alternative)"],
+                },
                 400,
             )
 
@@ -2724,37 +3963,23 @@ def api_validate_menu():
                 return False
 
             # Allow ASCII + common English Unicode punctuation (en-dash, em-dash, smart quotes, degree, etc.)
-            # Flag Hebrew (U+0590-U+05FF), Arabic (U+0600-U+06FF), and other non-Latin scripts
-
-            try:
-                # First try pure ASCII (fastest path)
-                s.encode("ascii")
-                return True
-            except UnicodeEncodeError:
-                # If not ASCII, check if it contains Hebrew, Arabic, or other non-Latin scripts
-                # Allow common English Unicode: en-dash (–), em-dash (—), smart quotes, degree, fractions, etc.
-                for char in s:
-                    code_point = ord(char)
-                    # Reject Hebrew, Arabic, Cyrillic, Chinese, Japanese, Korean, etc.
-                    if (
-                        0x0590 <= code_point <= 0x05FF  # Hebrew
-                        or 0x0600 <= code_point <= 0x06FF  # Arabic
-                        or 0x0400 <= code_point <= 0x04FF  # Cyrillic
-                        or 0x4E00 <= code_point <= 0x9FFF  # CJK Unified Ideographs
-                        or 0x3040 <= code_point <= 0x309F  # Hiragana
-                        or 0x30A0 <= code_point <= 0x30FF  # Katakana
-                        or 0xAC00 <= code_point <= 0xD7AF
-                    ):  # Hangul
-                        return False
-                # If no non-Latin scripts found, it's acceptable English with Unicode punctuation
+            # Flag Hebrew, Arabic and other non-Latin scripts
+            if s.isascii():
                 return True
-            except Exception:
-                return False
+            return _NON_LATIN_RE.search(s) is None
 
         def _num(x, default=None):
+            # Cheap exits for the common cases before paying for float()/exception handling
+            if x is None:
+                return default
+            cls = type(x)
+            if cls is float:
+                return x
+            if cls is int:
+                return float(x)
             try:
                 return float(x)
-            except Exception:
+            except (TypeError, ValueError, OverflowError):
                 return default
 
         def _close(a, b, tol=1.0):
@@ -2780,50 +4005,25 @@ def api_validate_menu():
                 return []
 
             kosher_issues = []
-            meat_items = ["chicken", "beef", "lamb", "turkey", "duck", "meat", "poultry"]
-            dairy_items = [
-                "milk",
-                "cream",
-                "cheese",
-                "yogurt",
-                "butter",
-                "dairy",
-                "parmesan",
-                "mozzarella",
-                "ricotta",
-                "cottage cheese",
-            ]
-            non_kosher_items = [
-                "pork",
-                "bacon",
-                "ham",
-                "shellfish",
-                "shrimp",
-                "lobster",
-                "crab",
-                "clam",
-                "oyster",
-                "scallop",
-            ]
-
             has_meat, has_dairy = False, False
             meat_ings, dairy_ings = [], []
 
             for ing in ingredients or []:
                 item_name = str(ing.get("item", "")).lower()
+                found = _KOSHER_MATCHER.hits(item_name)
 
-                # Non-kosher check
-                for nk in non_kosher_items:
-                    if nk in item_name:
+                # Non-kosher check (one issue per keyword found)
+                for nk in _NON_KOSHER_ITEMS:
+                    if nk in found:
                         kosher_issues.append(
                             f"Non-kosher ingredient detected: {ing.get('item', '')}"
                         )
 
                 # Meat/dairy check
-                if any(m in item_name for m in meat_items):
+                if not found.isdisjoint(_KOSHER_MEAT_ITEMS):
                     has_meat = True
                     meat_ings.append(ing.get("item", ""))
-                if any(d in item_name for d in dairy_items):
+                if not found.isdisjoint(_KOSHER_DAIRY_ITEMS):
                     has_dairy = True
                     dairy_ings.append(ing.get("item", ""))
 
@@ -2836,57 +4036,12 @@ def api_validate_menu():
 
         def _validate_dietary_restrictions(ingredients, limitations_list, allergies_list):
             """Validate general dietary limitations and allergies (not just kosher)"""
-            issues = []
-
-            # Normalize lists to lowercase for comparison
-            limitations_normalized = [str(lim).lower().strip() for lim in limitations_list if lim]
-
-            allergies_normalized = [
-                str(allergy).lower().strip() for allergy in allergies_list if allergy
-            ]
-
-            # Skip kosher as it's handled separately
-            limitations_normalized = [lim for lim in limitations_normalized if lim != "kosher"]
-
-            for ing in ingredients or []:
-                item_name = str(ing.get("item", "")).lower()
-
-                # Check allergies (exact or substring match)
-                for allergy in allergies_normalized:
-                    if allergy in item_name or item_name in allergy:
-                        issues.append(
-                            f"ALLERGY VIOLATION: Contains '{ing.get('item', '')}' which matches allergy '{allergy}'"
-                        )
-
-                # Check limitations (exact or substring match)
-                for limitation in limitations_normalized:
-                    # "X-free" means diet must avoid X; flag only if item contains X and is not explicitly X-free
-                    if limitation.endswith("-free") and len(limitation) > 5:
-                        substance = limitation[:-5].strip()  # e.g. "gluten-free" -> "gluten"
-                        safe_phrases = (limitation.replace("-", " "), limitation)  # "gluten free", "gluten-free"
-                        if substance in item_name:
-                            if not any(phrase in item_name for phrase in safe_phrases):
-                                issues.append(
-                                    f"DIETARY LIMITATION VIOLATION: Contains '{ing.get('item', '')}' which violates limitation '{limitation}'"
-                                )
-                        continue
-                    # Handle common patterns like "no chicken", "no beef", etc.
-                    if limitation.startswith("no ") or limitation.startswith("avoid "):
-                        # Extract the food item from "no chicken" -> "chicken"
-                        food_item = limitation.replace("no ", "").replace("avoid ", "").strip()
-
-                        if food_item in item_name or item_name in food_item:
-                            issues.append(
-                                f"DIETARY LIMITATION VIOLATION: Contains '{ing.get('item', '')}' which violates limitation '{limitation}'"
-                            )
-                    else:
-                        # Direct match (e.g., "chicken", "beef") — things to avoid
-                        if limitation in item_name or item_name in limitation:
-                            issues.append(
-                                f"DIETARY LIMITATION VIOLATION: Contains '{ing.get('item', '')}' which violates limitation '{limitation}'"
-                            )
-
-            return issues
+            # Normalize lists to lowercase for comparison; parsed rules are cached per list pair
+            rules = dietary_rules(
+                tuple(str(lim).lower().strip() for lim in limitations_list if lim),
+                tuple(str(allergy).lower().strip() for allergy in allergies_list if allergy),
+            )
+            return rules.issues(ingredients)
 
         # -------- schema checks ----------
         # Required top-level keys in candidate
@@ -2945,20 +4100,24 @@ def api_validate_menu():
                             f"{option.capitalize()} ingredient #{idx+1} '{mk}' cannot be negative."
                         )
 
-        # Template targets presence
-        for macro in macros:
-            if macro not in tpl:
-                issues.append(f"Template for {option} missing target '{macro}'.")
+        # Template targets presence (one set check; report in macro order)
+        missing_targets = _MACRO_KEY_SET.difference(tpl)
+        if missing_targets:
+            issues.extend(
+                f"Template for {option} missing target '{macro}'."
+                for macro in _MACRO_KEYS
+                if macro in missing_targets
+            )
 
         # -------- ingredient sum validation against template targets (with margins) ----------
         # TEMPORARILY DISABLED FOR DEBUGGING
-        # sums = {m: 0.0 for m in macros}
+        # sums = {m: 0.0 for m in _MACRO_KEYS}
         #
         # for ing in ingredients or []:
-        #     for m in macros:
+        #     for m in _MACRO_KEYS:
         #         sums[m] += _num(ing.get(m), 0.0)
         #
-        # for m in macros:
+        # for m in _MACRO_KEYS:
         #     target = _num(tpl.get(m), default=None)
         #     if target is None or target == 0:
         #         continue
@@ -2994,67 +4153,67 @@ def api_validate_menu():
 
         is_valid = len(issues) == 0
 
-        return jsonify(
+        return (
             {
                 "is_valid": is_valid,
                 "issues": issues,
                 "meal_data": mn,  # Include the actual meal JSON that was validated
                 "option_type": option,  # Include which option type was validated
-            }
+            },
+            200,
         )
 
     except Exception as e:
 
         logger.error("❌ Exception in /api/validate-menu:\n%s", traceback.format_exc())
 
-        return jsonify({"is_valid": False, "issues": [str(e)]}), 500
+        return {"is_valid": False, "issues": [str(e)]}, 500
 
 
 @app.route("/api/validate-template", methods=["POST"])
 def api_validate_template():
+    data = request.json or {}
+    result, status = _validate_template_impl(data.get("template"), data.get("user_code"))
+    return jsonify(result), status
 
-    try:
-
-        data = request.json
-
-        template = data.get("template")
 
-        user_code = data.get("user_code")
+def _validate_template_impl(template, user_code, preferences=None):
+    """
+    Check a template's daily totals and main/alternative similarity.
+    Returns (result, http_status) so in-process callers skip the HTTP round trip.
+    Callers that already hold the client's preferences can pass them in.
+    """
+    try:
 
         # logger.info(f"🔍 validate-template called with user_code: {user_code}")
 
-        # logger.info(f"🔍 Request data keys: {list(data.keys()) if data else 'None'}")
-
-        preferences = load_user_preferences(user_code)
+        if preferences is None:
+            preferences = load_user_preferences(user_code)
 
         if not template or not isinstance(template, list):
-            return jsonify({"error": "Invalid or missing template"}), 400
+            return {"error": "Invalid or missing template"}, 400
 
         logger.info("🔍 Validating template totals (main & alternative)...")
 
         # Calculate total calories, protein, and fat for main and alternative
-        total_main = {"calories": 0, "protein": 0, "fat": 0}
-        total_alt = {"calories": 0, "protein": 0, "fat": 0}
+        # (local accumulators in one pass; the dicts are built once at the end)
+        main_calories = main_protein = main_fat = 0
+        alt_calories = alt_protein = alt_fat = 0
 
         for meal in template:
             main = meal.get("main", {})
             alt = meal.get("alternative", {})
-            total_main["calories"] += float(main.get("calories", 0))
-            total_main["protein"] += float(main.get("protein", 0))
-            total_main["fat"] += float(main.get("fat", 0))
-            total_alt["calories"] += float(alt.get("calories", 0))
-            total_alt["protein"] += float(alt.get("protein", 0))
-            total_alt["fat"] += float(alt.get("fat", 0))
+            main_calories += float(main.get("calories", 0))
+            main_protein += float(main.get("protein", 0))
+            main_fat += float(main.get("fat", 0))
+            alt_calories += float(alt.get("calories", 0))
+            alt_protein += float(alt.get("protein", 0))
+            alt_fat += float(alt.get("fat", 0))
 
-        # Get target macros from preferences
-        def parse_macro(value):
-            if value is None:
-                return 0.0
-            try:
-                return float(str(value).replace("g", "").strip())
-            except (ValueError, TypeError):
-                return 0.0
+        total_main = {"calories": main_calories, "protein": main_protein, "fat": main_fat}
+        total_alt = {"calories": alt_calories, "protein": alt_protein, "fat": alt_fat}
 
+        # Get target macros from preferences
         calories_per_day = preferences.get("calories_per_day", 2000)
         if calories_per_day is None:
             calories_per_day = 2000
@@ -3066,8 +4225,8 @@ def api_validate_template():
 
         target_macros = {
             "calories": float(calories_per_day),
-            "protein": parse_macro(macros.get("protein", "150g")),
-            "fat": parse_macro(macros.get("fat", "80g")),
+            "protein": _parse_macro(macros.get("protein", "150g")),
+            "fat": _parse_macro(macros.get("fat", "80g")),
         }
 
         # Add debug logging
@@ -3079,47 +4238,31 @@ def api_validate_template():
         logger.info(f"🔍 Raw fat from preferences: {macros.get('fat')}")
         logger.info(f"🔍 Parsed target_macros: {target_macros}")
 
-        def is_out_of_range(actual, target, margin=0.05):  # 5% margin
-            if target == 0:
-                return False
-
-            return abs(actual - target) / target > margin
-
-        # Collect issues for main and alternative
+        # One pass over the macros, rounding each total once: main and alternative against
+        # the target (5% margin, only out-of-range totals are formatted) and against each
+        # other (±3g tolerance)
         issues_main = []
         issues_alt = []
-
-        for macro in total_main:
-            # MAIN
-            actual_main = round(total_main[macro], 1)
-            expected = target_macros.get(macro, 0)
-
-            if is_out_of_range(actual_main, expected):
-                percent_off = round((actual_main - expected) / expected * 100, 3)
-
-                issues_main.append(
-                    f"Main: Total {macro}: {actual_main} vs target {expected} ({percent_off:+}%)"
-                )
-
-            # ALT
-            actual_alt = round(total_alt[macro], 1)
-
-            if is_out_of_range(actual_alt, expected):
-                percent_off = round((actual_alt - expected) / expected * 100, 3)
-
-                issues_alt.append(
-                    f"Alternative: Total {macro}: {actual_alt} vs target {expected} ({percent_off:+}%)"
-                )
-
-        # Check for equality between main and alternative macros (with ±3g tolerance)
         main_alt_issues = []
         TOLERANCE_GRAMS = 3.0
 
-        for macro in total_main:
-            main_val = round(total_main[macro], 1)
+        for macro, main_total in total_main.items():
+            main_val = round(main_total, 1)
             alt_val = round(total_alt[macro], 1)
-            diff = abs(main_val - alt_val)
+            expected = target_macros.get(macro, 0)
+
+            if expected != 0:
+                for label, actual, section_issues in (
+                    ("Main", main_val, issues_main),
+                    ("Alternative", alt_val, issues_alt),
+                ):
+                    diff = actual - expected
+                    if abs(diff) / expected > 0.05:
+                        section_issues.append(
+                            f"{label}: Total {macro}: {actual} vs target {expected} ({round(diff / expected * 100, 3):+}%)"
+                        )
 
+            diff = abs(main_val - alt_val)
             if diff > TOLERANCE_GRAMS:
                 main_alt_issues.append(
                     f"Main vs Alternative {macro} mismatch: Main={main_val}, Alt={alt_val} (diff={diff:.1f}g, allowed: ±{TOLERANCE_GRAMS}g)"
@@ -3181,7 +4324,7 @@ def api_validate_template():
         is_valid_similarity = len(similarity_issues) == 0
         is_valid = is_valid and is_valid_similarity
 
-        return jsonify(
+        return (
             {
                 "is_valid": is_valid,
                 "is_valid_main": is_valid_main,
@@ -3194,12 +4337,16 @@ def api_validate_template():
                 "totals_main": {k: round(v, 1) for k, v in total_main.items()},
                 "totals_alt": {k: round(v, 1) for k, v in total_alt.items()},
                 "targets": target_macros,
-            }
+            },
+            200,
         )
 
     except Exception as e:
         logger.error("❌ Exception in /api/validate-template:\n%s", traceback.format_exc())
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+
+_ISRAELI_REGIONS = frozenset(("israel", "il", "isr", "israeli"))  # Region spellings served by the Hebrew UPC endpoint
 
 
 def prepare_upc_lookup_params(brand, name, region="israel"):
@@ -3211,9 +4358,7 @@ def prepare_upc_lookup_params(brand, name, region="israel"):
 
     # Normalize region to handle different variations
     region_normalized = region.lower().strip() if region else "israel"
-
-    israeli_variations = ["israel", "il", "isr", "israeli"]
-    is_israeli = region_normalized in israeli_variations
+    is_israeli = region_normalized in _ISRAELI_REGIONS
 
     if is_israeli:
         # For Israeli region: combine brand and name but avoid duplication
@@ -3258,66 +4403,81 @@ def enrich_menu_with_upc():
 
         logger.info(f"🔍 Starting UPC enrichment for menu with region: {region}")
 
-        # Process each meal and add UPC codes
-        enriched_menu = []
+        def _lookup_upc(ing):
+            """UPC for one ingredient, or None when it cannot be looked up."""
+            brand = ing.get("brand of pruduct", "")
+            name = ing.get("item", "")
 
-        for meal in menu:
-            enriched_meal = meal.copy()
+            # Log what we're about to look up
+            app.logger.info("Looking up UPC for brand=%r, name=%r", brand, name)
 
-            for section in ("main", "alternative"):
-                if section in enriched_meal:
-                    block = enriched_meal[section].copy()
-                    enriched_ingredients = []
-
-                    for ing in block.get("ingredients", []):
-                        enriched_ing = ing.copy()
-                        brand = enriched_ing.get("brand of pruduct", "")
-                        name = enriched_ing.get("item", "")
-
-                        # Log what we're about to look up
-                        app.logger.info(f"Looking up UPC for brand={brand!r}, name={name!r}")
-
-                        try:
-                            # Determine endpoint and parameters based on region
-                            endpoint_type, params, is_israeli = prepare_upc_lookup_params(
-                                brand, name, region
-                            )
+            try:
+                # Determine endpoint and parameters based on region
+                endpoint_type, params, is_israeli = prepare_upc_lookup_params(
+                    brand, name, region
+                )
 
-                            if not endpoint_type:
-                                enriched_ing["UPC"] = None
-                                app.logger.warning(
-                                    f"No valid parameters for UPC lookup: brand={brand!r}, name={name!r}"
-                                )
-                                enriched_ingredients.append(enriched_ing)
-                                continue
-
-                            # Choose the appropriate endpoint
-                            if endpoint_type == "hebrew":
-                                url = "https://sqlservice-erdve2fpeda4f5hg.eastus2-01.azurewebsites.net/api/ingredient-upc-hebrew"
-                                app.logger.info(f"Using Hebrew UPC endpoint for region: {region}")
-                            else:
-                                url = "https://sqlservice-erdve2fpeda4f5hg.eastus2-01.azurewebsites.net/api/ingredient-upc"
-                                app.logger.info(f"Using regular UPC endpoint for region: {region}")
+                if not endpoint_type:
+                    app.logger.warning(
+                        "No valid parameters for UPC lookup: brand=%r, name=%r", brand, name
+                    )
+                    return None
+
+                # Choose the appropriate endpoint
+                if endpoint_type == "hebrew":
+                    url = "https://sqlservice-erdve2fpeda4f5hg.eastus2-01.azurewebsites.net/api/ingredient-upc-hebrew"
+                    app.logger.info("Using Hebrew UPC endpoint for region: %s", region)
+                else:
+                    url = "https://sqlservice-erdve2fpeda4f5hg.eastus2-01.azurewebsites.net/api/ingredient-upc"
+                    app.logger.info("Using regular UPC endpoint for region: %s", region)
+
+                resp = _http_session.get(url, params=params, timeout=30)
+                app.logger.info("UPC lookup HTTP %s — URL: %s", resp.status_code, resp.url)
+                # Decoding the body is only worth it when someone is reading debug logs
+                if app.logger.isEnabledFor(logging.DEBUG):
+                    app.logger.debug("UPC lookup response body: %s", resp.text)
+
+                resp.raise_for_status()
+                upc_data = resp.json()
+
+                upc = upc_data.get("upc")
 
-                            resp = requests.get(url, params=params, timeout=30)
-                            app.logger.info(f"UPC lookup HTTP {resp.status_code} — URL: {resp.url}")
-                            app.logger.info(f"UPC lookup response body: {resp.text}")
+                app.logger.info("Parsed UPC: %r", upc)
 
-                            resp.raise_for_status()
-                            upc_data = resp.json()
+                return upc
 
-                            enriched_ing["UPC"] = upc_data.get("upc")
+            except Exception as e:
+                app.logger.warning("UPC lookup failed for %r %r: %s", brand, name, e)
+                return None
 
-                            app.logger.info(f"Parsed UPC: {enriched_ing['UPC']!r}")
+        # Look up every ingredient across all meals concurrently on the shared I/O pool,
+        # then rebuild the menu once with each ingredient's UPC filled in
+        ingredients = [
+            ing
+            for meal in menu
+            for section in ("main", "alternative")
+            if meal.get(section)
+            for ing in meal[section].get("ingredients") or []
+        ]
+        upcs = _gather([lambda ing=ing: _lookup_upc(ing) for ing in ingredients])
+        upc_by_ingredient = {id(ing): upc for ing, upc in zip(ingredients, upcs)}
 
-                        except Exception as e:
-                            enriched_ing["UPC"] = None
-                            app.logger.warning(f"UPC lookup failed for {brand!r} {name!r}: {e}")
+        enriched_menu = []
 
-                        enriched_ingredients.append(enriched_ing)
+        for meal in menu:
+            enriched_meal = {**meal}
 
-                    block["ingredients"] = enriched_ingredients
-                    enriched_meal[section] = block
+            for section in ("main", "alternative"):
+                block = meal.get(section)
+                if not block:
+                    continue
+                enriched_meal[section] = {
+                    **block,
+                    "ingredients": [
+                        {**ing, "UPC": upc_by_ingredient[id(ing)]}
+                        for ing in block.get("ingredients") or []
+                    ],
+                }
 
             enriched_menu.append(enriched_meal)
 
@@ -3363,39 +4523,30 @@ def batch_upc_lookup():
             f"🔍 Starting batch UPC lookup for {len(ingredients)} ingredients with region: {region}"
         )
 
-        results = []
-
-        # Process all ingredients in parallel-like manner (simulate concurrent processing)
-        for ingredient in ingredients:
+        def _lookup_upc(ingredient):
             brand = ingredient.get("brand", "").strip()
             name = ingredient.get("name", "").strip()
 
             if not brand and not name:
-                results.append(
-                    {"brand": brand, "name": name, "upc": None, "error": "Missing brand and name"}
-                )
-                continue
+                return {"brand": brand, "name": name, "upc": None, "error": "Missing brand and name"}
 
             try:
                 # Determine endpoint and parameters based on region
                 endpoint_type, params, is_israeli = prepare_upc_lookup_params(brand, name, region)
 
                 if not endpoint_type:
-                    results.append(
-                        {"brand": brand, "name": name, "upc": None, "error": "No valid parameters"}
-                    )
-                    continue
+                    return {"brand": brand, "name": name, "upc": None, "error": "No valid parameters"}
 
                 # Choose the appropriate endpoint
                 if endpoint_type == "hebrew":
                     url = "https://sqlservice-erdve2fpeda4f5hg.eastus2-01.azurewebsites.net/api/ingredient-upc-hebrew"
-                    logger.info(f"Using Hebrew UPC endpoint for region: {region}")
+                    logger.info("Using Hebrew UPC endpoint for region: %s", region)
                 else:
                     url = "https://sqlservice-erdve2fpeda4f5hg.eastus2-01.azurewebsites.net/api/ingredient-upc"
-                    logger.info(f"Using regular UPC endpoint for region: {region}")
+                    logger.info("Using regular UPC endpoint for region: %s", region)
 
                 # Use the appropriate UPC lookup service
-                resp = requests.get(
+                resp = _http_session.get(
                     url, params=params, timeout=30
                 )  # Increased timeout for complex Hebrew searches
 
@@ -3403,29 +4554,29 @@ def batch_upc_lookup():
                     upc_data = resp.json()
                     upc_code = upc_data.get("upc")
 
-                    results.append({"brand": brand, "name": name, "upc": upc_code})
+                    logger.info("✅ Found UPC for %s %s: %s", brand, name, upc_code)
 
-                    logger.info(f"✅ Found UPC for {brand} {name}: {upc_code}")
-                else:
-                    results.append(
-                        {
-                            "brand": brand,
-                            "name": name,
-                            "upc": None,
-                            "error": f"HTTP {resp.status_code}",
-                        }
-                    )
-                    logger.warning(
-                        f"❌ UPC lookup failed for {brand} {name}: HTTP {resp.status_code}"
-                    )
+                    return {"brand": brand, "name": name, "upc": upc_code}
+
+                logger.warning("❌ UPC lookup failed for %s %s: HTTP %s", brand, name, resp.status_code)
+                return {
+                    "brand": brand,
+                    "name": name,
+                    "upc": None,
+                    "error": f"HTTP {resp.status_code}",
+                }
 
             except requests.exceptions.Timeout:
-                results.append({"brand": brand, "name": name, "upc": None, "error": "Timeout"})
-                logger.warning(f"⏰ UPC lookup timed out for {brand} {name}")
+                logger.warning("⏰ UPC lookup timed out for %s %s", brand, name)
+                return {"brand": brand, "name": name, "upc": None, "error": "Timeout"}
 
             except Exception as e:
-                results.append({"brand": brand, "name": name, "upc": None, "error": str(e)})
-                logger.warning(f"❌ UPC lookup failed for {brand} {name}: {e}")
+                logger.warning("❌ UPC lookup failed for %s %s: %s", brand, name, e)
+                return {"brand": brand, "name": name, "upc": None, "error": str(e)}
+
+        # All lookups run concurrently on the shared I/O pool over the pooled session;
+        # results keep the order of the request's ingredients
+        results = _gather([lambda ing=ing: _lookup_upc(ing) for ing in ingredients])
 
         successful_lookups = len([r for r in results if r.get("upc")])
 
@@ -3504,33 +4655,31 @@ HARD RULES
 
  Only include unhealthy items if client explicitly requests them in preferences.
 
- **CRITICAL: STRICTLY AVOID ALL FOODS IN ALLERGIES LIST** - This is life-threatening: {allergies_list}
+ **CRITICAL: STRICTLY AVOID ALL FOODS IN ALLERGIES LIST** - This is life-threatening (see ALLERGIES under THIS REQUEST).
 
- **CRITICAL: STRICTLY FOLLOW ALL DIETARY LIMITATIONS** - Never include these foods/ingredients: {limitations_list}
+ **CRITICAL: STRICTLY FOLLOW ALL DIETARY LIMITATIONS** - Never include these foods/ingredients (see DIETARY LIMITATIONS under THIS REQUEST).
 
  If kosher: never mix meat + dairy; avoid pork/shellfish; prefer kosher-suitable brands.
 
  ≤ 7 ingredients; simple methods (grill, bake, steam, sauté).
 
- Use realistic regional pack sizes & brands:
-
-  {region_instruction}
+ Use realistic regional pack sizes & brands (see REGION under THIS REQUEST).
 
 MACRO TARGETS
 
-The sum of all ingredients must match these targets within margin: {macro_targets}.
+The sum of all ingredients must match the MACRO TARGETS under THIS REQUEST within margin.
 
 CRITICAL: Cross-check every ingredient's macro values against reliable nutrition databases to ensure accuracy.
 
 DIFFERENTIATION (from both the given MAIN and CURRENT ALTERNATIVE)
 
- **Different main protein source** (avoid: {avoid_proteins}).
+ **Different main protein source** (avoid the AVOID PROTEINS under THIS REQUEST).
 
  **Different carb base** and **different cooking method**.
 
  **Different flavour profile** (e.g., if Mediterranean, switch to Asian/Mexican/Italian).
 
- Avoid these core ingredients (substring match): {avoid_ingredients}.
+ Avoid the AVOID INGREDIENTS under THIS REQUEST (substring match).
 
 VALIDATION
 
@@ -3540,10 +4689,23 @@ VALIDATION
 
  The validator will sum all ingredient macros and check against targets with appropriate margins.
 
- If you see a previous meal attempt above, analyze what went wrong and fix those specific issues.
+ If you see a previous meal attempt in this prompt, analyze what went wrong and fix those specific issues.
 
  Pay special attention to macro calculations, ingredient accuracy, and dietary restrictions.
 
+THIS REQUEST
+
+• ALLERGIES (LIFE THREATENING - ZERO TOLERANCE): {allergies_list}
+
+• DIETARY LIMITATIONS: {limitations_list}
+
+• REGION: {region_instruction}
+
+• MACRO TARGETS: {macro_targets}
+
+• AVOID PROTEINS: {avoid_proteins}
+
+• AVOID INGREDIENTS: {avoid_ingredients}
 """
 
 
@@ -3555,8 +4717,8 @@ def _extract_macros(meal_obj: dict) -> dict:
 
     nutr = meal_obj.get("nutrition") or {}
 
-    if all(k in nutr for k in ("calories", "protein", "fat", "carbs")):
-        return {k: nutr.get(k) for k in ("calories", "protein", "fat", "carbs")}
+    if isinstance(nutr, dict) and nutr.keys() >= _MACRO_KEY_SET:
+        return {k: nutr[k] for k in _MACRO_KEYS}
 
     return {
         "calories": meal_obj.get("calories"),
@@ -3595,53 +4757,34 @@ def _collect_avoid_lists(main: dict, current_alt: dict):
 
 
 def _collect_avoid_lists_from_all_alternatives(main: dict, all_alternatives: list):
-    """Collect proteins & ingredients to avoid based on main and ALL alternatives for better duplication avoidance."""
-    avoid_proteins = set()
+    """
+    Collect proteins & ingredients to avoid based on main and ALL alternatives for better duplication avoidance.
+    One pass over the meals; names are de-duplicated case-insensitively and keep first-seen
+    order, so the same meals always produce the same prompt text.
+    """
+    avoid_proteins = {}  # casefolded -> name as first seen
+    avoid_ingredients = {}
 
-    # Add main meal
-    if main:
-        src = main.get("main_protein_source")
+    for meal in (main, *all_alternatives):
+        if not meal:
+            continue
 
+        src = meal.get("main_protein_source")
         if isinstance(src, str) and src.strip():
-            avoid_proteins.add(src.strip())
-
-    # Add all alternatives
-    for alt in all_alternatives:
-        if alt:
-            src = alt.get("main_protein_source")
+            src = src.strip()
+            avoid_proteins.setdefault(src.casefold(), src)
 
-            if isinstance(src, str) and src.strip():
-                avoid_proteins.add(src.strip())
-
-    def _ing_names(m):
-        out = []
-
-        for ing in m.get("ingredients") or []:
+        for ing in meal.get("ingredients") or []:
             name = (ing.get("item") or "").strip()
-
             if name:
-                out.append(name)
+                avoid_ingredients.setdefault(name.casefold(), name)
 
         # Also avoid words from meal_title to reduce overlap
-        mt = (m.get("meal_title") or "").strip()
-
+        mt = (meal.get("meal_title") or "").strip()
         if mt:
-            out.append(mt)
-
-        return out
+            avoid_ingredients.setdefault(mt.casefold(), mt)
 
-    avoid_ingredients = set()
-
-    # Add main meal ingredients
-    if main:
-        avoid_ingredients.update(_ing_names(main))
-
-    # Add all alternatives ingredients
-    for alt in all_alternatives:
-        if alt:
-            avoid_ingredients.update(_ing_names(alt))
-
-    return list(avoid_proteins), list(avoid_ingredients)
+    return list(avoid_proteins.values()), list(avoid_ingredients.values())
 
 
 @app.route("/api/generate-alternative-meal", methods=["POST"])
@@ -3682,7 +4825,7 @@ def generate_alternative_meal():
     # Macro targets: mirror the MAIN meal's totals (strict)
     macro_targets = _extract_macros(main)
 
-    if any(macro_targets.get(k) is None for k in ("calories", "protein", "fat", "carbs")):
+    if any(macro_targets.get(k) is None for k in _MACRO_KEYS):
         return (
             jsonify(
                 {"error": "Main meal lacks complete macro totals (calories, protein, fat, carbs)."}
@@ -3698,7 +4841,7 @@ def generate_alternative_meal():
     # Try multiple times until it validates
     for attempt in range(1, max_attempts + 1):
         try:
-            app.logger.info(f"🧠 Generating NEW ALTERNATIVE (attempt {attempt}/{max_attempts})")
+            app.logger.info("🧠 Generating NEW ALTERNATIVE (attempt %d/%d)", attempt, max_attempts)
 
             # FIRST ATTEMPT: Use full detailed prompt
             if attempt == 1:
@@ -3722,7 +4865,7 @@ def generate_alternative_meal():
 
 Here is the meal you generated:
 
-{json.dumps(previous_candidate, ensure_ascii=False, indent=2)}
+{_json_dumps(previous_candidate, indent=True)}
 
 These are the validation issues that need to be fixed:
 
@@ -3745,18 +4888,20 @@ Return ONLY valid JSON, no markdown fences or explanations."""
                 "user_preferences": preferences,
             }
 
-            response = client.chat.completions.create(
+            content = _stream_json_completion(
                 model=deployment,
                 messages=[
                     {"role": "system", "content": enhanced_system_prompt},
-                    {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
+                    {"role": "user", "content": _json_dumps(user_payload)},
                 ],
+                max_tokens=MEAL_BUILDER_MAX_TOKENS,
+                response_format={"type": "json_object"},
             )
 
-            raw = _strip_markdown_fences(response.choices[0].message.content)
+            raw = _strip_markdown_fences(content)
 
             try:
-                candidate = json.loads(raw)
+                candidate = _json_loads(raw)
             except Exception as e:
                 error_msg = f"JSON parse error: {e}"
                 app.logger.warning(f"❌ {error_msg} for NEW ALTERNATIVE")
@@ -3771,26 +4916,24 @@ Return ONLY valid JSON, no markdown fences or explanations."""
             tpl = [{"alternative": macro_targets}]
             menu = [{"alternative": candidate}]
 
-            val_res = app.test_client().post(
-                "/api/validate-menu", json={"template": tpl, "menu": menu, "user_code": user_code}
-            )
-
-            val = val_res.get_json() or {}
+            val, _ = _validate_menu_impl(tpl, menu, user_code)
 
             if not val.get("is_valid"):
                 # Collect validation issues for next attempt
                 issues = val.get("issues", [])
                 failed_meal = val.get("meal_data", {})
 
-                app.logger.warning(
-                    f"❌ NEW ALTERNATIVE failed validation. Meal: {json.dumps(failed_meal, ensure_ascii=False)}, Issues: {issues}"
-                )
+                if app.logger.isEnabledFor(logging.WARNING):
+                    app.logger.warning(
+                        f"❌ NEW ALTERNATIVE failed validation. Meal: {_json_dumps(failed_meal)}, Issues: {issues}"
+                    )
 
                 # Store the failed candidate for retry
                 previous_candidate = candidate
 
-                # Format validation feedback for next attempt
-                validation_feedback = "\n".join([f"• {issue}" for issue in issues])
+                # Format validation feedback only when another attempt will read it
+                if attempt < max_attempts:
+                    validation_feedback = "\n".join(f"• {issue}" for issue in issues)
                 previous_issues.extend(issues)
 
                 if attempt == max_attempts:
@@ -3861,8 +5004,6 @@ Return ONLY valid JSON, no markdown fences or explanations."""
 
 def enrich_alternative_with_upc(alternative, user_code, region):
     # This function mimics the logic in enrich_menu_with_upc but for a single alternative dict
-    import requests
-
     block = alternative.copy()
     enriched_ingredients = []
 
@@ -3885,10 +5026,6 @@ def enrich_alternative_with_upc(alternative, user_code, region):
             else:
                 if endpoint_type == "hebrew":
                     url = "https://sqlservice-erdve2fpeda4f5hg.eastus2-01.azurewebsites.net/api/ingredient-upc-hebrew"
-
-                    print("Tenant ID:", AZURE_TENANT_ID)
-                    print("Client ID:", AZURE_CLIENT_ID)
-                    print("Client Secret:", AZURE_CLIENT_SECRET)
                 else:
                     url = "https://sqlservice-erdve2fpeda4f5hg.eastus2-01.azurewebsites.net/api/ingredient-upc"
 
@@ -3898,10 +5035,11 @@ def enrich_alternative_with_upc(alternative, user_code, region):
                     logger.warning("[UPC] No Azure access token available, skipping UPC lookup.")
                     enriched_ing["UPC"] = None
                 else:
-                    resp = requests.get(url, params=params, headers=headers, timeout=30)
+                    resp = _http_session.get(url, params=params, headers=headers, timeout=30)
 
-                    logger.info(f"[UPC] HTTP {resp.status_code} — URL: {resp.url}")
-                    logger.info(f"[UPC] Response body: {resp.text}")
+                    logger.info("[UPC] HTTP %s — URL: %s", resp.status_code, resp.url)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("[UPC] Response body: %s", resp.text)
 
                     resp.raise_for_status()
                     upc_data = resp.json()
@@ -3918,7 +5056,7 @@ def enrich_alternative_with_upc(alternative, user_code, region):
 
     block["ingredients"] = enriched_ingredients
 
-    logger.info(f"[UPC] Final enriched ingredients: {enriched_ingredients}")
+    logger.info("[UPC] Final enriched ingredients: %s", enriched_ingredients)
 
     return block
 
@@ -4079,8 +5217,6 @@ def clean_ingredient_names(menu):
 
 
 def get_azure_access_token():
-    import requests
-
     tenant_id = AZURE_TENANT_ID
     client_id = AZURE_CLIENT_ID
     client_secret = AZURE_CLIENT_SECRET
@@ -4100,7 +5236,7 @@ def get_azure_access_token():
     }
 
     try:
-        token_resp = requests.post(token_url, data=token_data)
+        token_resp = _http_session.post(token_url, data=token_data, timeout=30)
 
         token_resp.raise_for_status()
 
@@ -4298,7 +5434,7 @@ Guidelines
 
             logger.info("🧠 Sending eating habits analysis to OpenAI")
 
-            response = client.chat.completions.create(
+            response = _openai_client().chat.completions.create(
                 model=deployment,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -4571,7 +5707,7 @@ Return ALL meals from the input - do not omit any."""
 
 **CURRENT MEAL PLAN:**
 
-{json.dumps(meal_plan_structure, indent=2, ensure_ascii=False)}
+{_json_dumps(meal_plan_structure, indent=True)}
 
 **EATING HABITS:**
 
@@ -4599,7 +5735,7 @@ Return ALL meals from the input - do not omit any."""
         try:
             logger.info("🧠 Sending meal plan update request to OpenAI")
 
-            response = client.chat.completions.create(
+            response = _openai_client().chat.completions.create(
                 model=deployment,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -4620,7 +5756,7 @@ Return ALL meals from the input - do not omit any."""
 
                 cleaned_result = _strip_markdown_fences(result_text)
 
-                updated_meal_plan = json.loads(cleaned_result)
+                updated_meal_plan = _json_loads(cleaned_result)
 
                 # Validate structure
 
@@ -4856,7 +5992,7 @@ Convert "{from_measurement}" of "{ingredient}" to {to_type} measurement.
 Please provide the most accurate conversion based on nutritional and culinary standards."""
 
         # Call Azure OpenAI
-        response = client.chat.completions.create(
+        response = _openai_client().chat.completions.create(
             model=deployment,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -4870,7 +6006,7 @@ Please provide the most accurate conversion based on nutritional and culinary st
 
         # Parse the JSON response
         try:
-            result = json.loads(raw_response.strip())
+            result = _json_loads(raw_response.strip())
 
             # Validate required fields
             required_fields = ["converted_measurement", "confidence", "method"]
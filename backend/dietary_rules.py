@@ -0,0 +1,176 @@
+"""
+Keyword matching and allergy / dietary limitation checks for menu ingredients.
+Kept free of Flask and Supabase so the rules can be imported (and tested) on their own.
+"""
+
+import re
+from functools import lru_cache
+
+# Optional Aho-Corasick automaton; without it matching falls back to substring checks and regexes
+try:
+    import ahocorasick
+
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class SubstringMatcher:
+    """
+    Reports which of a fixed set of lower-case keywords occur in a text, either anywhere
+    (plain substring semantics, like `keyword in text`) or at the start of a word. With
+    pyahocorasick installed this is one pass over the text regardless of how many keywords
+    there are; otherwise substring checks and per-keyword regexes.
+    """
+
+    def __init__(self, words):
+        self.words = tuple(dict.fromkeys(words))
+        self.automaton = None
+        self.word_patterns = ()
+
+        # The automaton cannot hold the empty string, and "" is in every text anyway
+        non_empty = [w for w in self.words if w]
+        self.always = {""} if len(non_empty) < len(self.words) else set()
+        if AHOCORASICK_AVAILABLE and non_empty:
+            self.automaton = ahocorasick.Automaton()
+            for word in non_empty:
+                self.automaton.add_word(word, word)
+            self.automaton.make_automaton()
+        else:
+            self.word_patterns = tuple(
+                (w, re.compile(r"(?<!\w)" + re.escape(w))) for w in non_empty
+            )
+
+    def hits(self, text):
+        """Return the set of keywords that are substrings of text."""
+        if self.automaton is None:
+            return {w for w in self.words if w in text}
+        return {word for _end, word in self.automaton.iter(text)} | self.always
+
+    def word_start_hits(self, text):
+        """Return the set of (non-empty) keywords that occur in text starting a word."""
+        if self.automaton is None:
+            return {w for w, pattern in self.word_patterns if pattern.search(text)}
+
+        found = set()
+        for end, word in self.automaton.iter(text):
+            start = end - len(word) + 1
+            if start == 0 or not _is_word_char(text[start - 1]):
+                found.add(word)
+        return found
+
+
+_FOOD_WORD_RE = re.compile(r"[^\W\d_]+")
+
+MIN_REVERSE_MATCH = 3  # Shorter item names ("a", "ic") are fragments, not foods
+
+
+def singular(word):
+    """Crude English singular for food words: "eggs" -> "egg", "berries" -> "berry", "tomatoes" -> "tomato"."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("oes", "ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def word_stems(text):
+    """Singularized word tokens of a lower-cased name."""
+    return frozenset(singular(word) for word in _FOOD_WORD_RE.findall(text))
+
+
+def _stems_overlap(item_stems, allergy_stems):
+    """True when one side's words all appear in the other ("egg" vs "eggs", "peanut" vs "peanut butter")."""
+    if not item_stems or not allergy_stems:
+        return False
+    return allergy_stems <= item_stems or item_stems <= allergy_stems
+
+
+class DietaryRules:
+    """
+    A user's allergies and dietary limitations parsed once for ingredient checks. Each
+    limitation becomes (kind, needle, safe_phrases, raw, stems): "free" ("gluten-free" flags
+    items containing "gluten" unless they say gluten-free), "avoid" ("no chicken" / "avoid
+    chicken") or "direct" ("chicken").
+
+    Matching tolerates plurals through singularized word tokens ("eggs" vs "egg"):
+    - allergies match both ways as a safety margin: the allergy anywhere in the item name
+      ("nut" flags "walnut"), the item name inside the allergy unless it is a fragment
+      shorter than MIN_REVERSE_MATCH characters, or either side's words all in the other
+    - limitations match forward only: the needle starting a word of the item name, or all
+      of the needle's words in the item, so "ham" flags "ham slices" but not "graham
+      crackers", and "butter" does not violate "no peanut butter"
+    """
+
+    def __init__(self, limitations, allergies):
+        self.allergies = [(allergy, word_stems(allergy)) for allergy in allergies]
+        self.limitations = []
+        for limitation in limitations:
+            if limitation == "kosher":
+                continue  # Handled by the kosher validator
+            if limitation.endswith("-free") and len(limitation) > 5:
+                substance = limitation[:-5].strip()  # e.g. "gluten-free" -> "gluten"
+                safe_phrases = (limitation.replace("-", " "), limitation)  # "gluten free", "gluten-free"
+                self.limitations.append(("free", substance, safe_phrases, limitation, frozenset()))
+                continue
+            if limitation.startswith("no ") or limitation.startswith("avoid "):
+                # Extract the food item from "no chicken" -> "chicken"
+                kind, needle = "avoid", limitation.replace("no ", "").replace("avoid ", "").strip()
+            else:
+                kind, needle = "direct", limitation
+            self.limitations.append((kind, needle, (), limitation, word_stems(needle)))
+
+        # One matcher for every needle, so each item name is scanned once per match mode
+        self.needs_substrings = bool(allergies) or any(rule[0] == "free" for rule in self.limitations)
+        self.needs_word_starts = any(rule[0] != "free" for rule in self.limitations)
+        self.matcher = SubstringMatcher(
+            list(allergies)
+            + [rule[1] for rule in self.limitations]
+            + [phrase for rule in self.limitations for phrase in rule[2]]
+        )
+
+    def issues(self, ingredients):
+        """Allergy and limitation violations for a meal's ingredient list."""
+        issues = []
+
+        for ing in ingredients or []:
+            item_name = str(ing.get("item", "")).lower()
+            found = self.matcher.hits(item_name) if self.needs_substrings else ()
+            words_found = self.matcher.word_start_hits(item_name) if self.needs_word_starts else ()
+            item_stems = word_stems(item_name)
+
+            # Check allergies (substring either way, or plural-tolerant words either way)
+            for allergy, allergy_stems in self.allergies:
+                if (
+                    allergy in found
+                    or (len(item_name) >= MIN_REVERSE_MATCH and item_name in allergy)
+                    or _stems_overlap(item_stems, allergy_stems)
+                ):
+                    issues.append(
+                        f"ALLERGY VIOLATION: Contains '{ing.get('item', '')}' which matches allergy '{allergy}'"
+                    )
+
+            # Check limitations ("X-free" by substring, the rest forward by word)
+            for kind, needle, safe_phrases, limitation, needle_stems in self.limitations:
+                if kind == "free":
+                    violated = needle in found and found.isdisjoint(safe_phrases)
+                else:
+                    violated = needle in words_found or bool(needle_stems and needle_stems <= item_stems)
+                if violated:
+                    issues.append(
+                        f"DIETARY LIMITATION VIOLATION: Contains '{ing.get('item', '')}' which violates limitation '{limitation}'"
+                    )
+
+        return issues
+
+
+@lru_cache(maxsize=256)
+def dietary_rules(limitations, allergies):
+    """Parsed DietaryRules for normalized (lower-cased, stripped) limitation and allergy tuples."""
+    return DietaryRules(limitations, allergies)
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dietary_rules import dietary_rules  # noqa: E402
+
+
+def _issues(item, limitations=(), allergies=()):
+    return dietary_rules(tuple(limitations), tuple(allergies)).issues([{"item": item}])
+
+
+@pytest.mark.parametrize(
+    "allergy, item",
+    [
+        ("eggs", "egg"),
+        ("egg", "scrambled eggs"),
+        ("peanuts", "peanut"),
+        ("peanut", "peanut butter"),
+        ("peanut butter", "peanut"),
+        ("nut", "walnut"),
+        ("berries", "berry"),
+    ],
+)
+def test_allergy_matches_both_ways(allergy, item):
+    assert _issues(item, allergies=[allergy])
+
+
+@pytest.mark.parametrize(
+    "limitation, item",
+    [
+        ("no eggs", "egg"),
+        ("no egg", "boiled eggs"),
+        ("avoid peanuts", "peanut"),
+        ("no ham", "ham slices"),
+        ("no peanut butter", "crunchy peanut butter"),
+    ],
+)
+def test_limitation_matches_plural(limitation, item):
+    assert _issues(item, limitations=[limitation])
+
+
+@pytest.mark.parametrize(
+    "limitation, item",
+    [
+        ("no peanut butter", "butter"),
+        ("no olive oil", "oil"),
+        ("no ice cream", "cream"),
+        ("no egg whites", "egg"),
+        ("chicken breast", "chicken"),
+        ("no ham", "graham crackers"),
+        ("no apple", "a"),
+    ],
+)
+def test_limitation_matches_forward_only(limitation, item):
+    assert not _issues(item, limitations=[limitation])
+
+
+def test_short_fragments_do_not_match_allergies():
+    assert not _issues("a", allergies=["apple"])
+
+
+def test_free_limitation_respects_safe_phrase():
+    assert _issues("wheat bread with gluten", limitations=["gluten-free"])
+    assert not _issues("gluten-free bread", limitations=["gluten-free"])